@@ -1,24 +1,30 @@
-from flask import Flask, render_template, request, redirect, url_for, flash, jsonify
+from flask import Flask, render_template, request, redirect, url_for, flash, jsonify, Response, stream_with_context
 from flask_login import LoginManager, UserMixin, login_user, logout_user, login_required, current_user
 from flask_sqlalchemy import SQLAlchemy
 from flask_migrate import Migrate
+import click
 import json
 import os
+import time
 from datetime import datetime
-from wordpress_xmlrpc import Client, WordPressPost
-from wordpress_xmlrpc.methods.posts import NewPost
-from wordpress_xmlrpc.methods.taxonomies import GetTerms
-from wordpress_xmlrpc.compat import xmlrpc_client
-from deepseek_audit import init_audit_service, get_audit_service
-from config import Config, DEEPSEEK_CONFIG, SERVER_CONFIG
-from models import db, User, Article, Tag, AuditLog, PublishLog
+from deepseek_audit import init_audit_service, get_audit_service, content_fingerprint
+from audit_jobs import AuditJobRunner
+from config import Config, DEEPSEEK_CONFIG, SERVER_CONFIG, REVISION_CONFIG
+from models import db, User, Article, Tag, AuditLog, PublishLog, UserArticleStats
+from article_search import apply_search, make_snippet, create_search_index, rebuild_search_index
+from article_text import extract_text
+from pagination import keyset_paginate, InvalidCursor
+from article_bulk import bulk_delete, bulk_set_status, BulkRequestError
+from log_retention import LOG_TABLES, run_retention
+from article_revisions import record_revision, load_revision, list_revisions, RevisionNotFound
+from wp_publisher import get_publisher
 
 app = Flask(__name__)
 app.config.from_object(Config)
 
 # 初始化扩展
 db.init_app(app)
-migrate = Migrate(app, db)
+migrate = Migrate(app, db, render_as_batch=True)
 
 # Flask-Login设置
 login_manager = LoginManager()
@@ -36,6 +42,43 @@ except Exception as e:
     print("   将使用基础审核模式")
     audit_service = init_audit_service('')
 
+# 后台审核任务（异步保存模式使用）
+audit_jobs = AuditJobRunner(app, audit_service, max_workers=DEEPSEEK_CONFIG.get('audit_workers', 4),
+                            stale_after=DEEPSEEK_CONFIG.get('background_timeout', 120))
+
+@app.cli.command('rebuild-stats')
+def rebuild_stats_command():
+    """按articles表重建用户文章统计表"""
+    UserArticleStats.rebuild()
+    db.session.commit()
+    print(f"✓ 已重建 {UserArticleStats.query.count()} 个用户的文章统计")
+
+@app.cli.command('rebuild-search')
+def rebuild_search_command():
+    """创建（如不存在）并重建文章全文索引"""
+    if create_search_index(db.session.connection(), rebuild=False):
+        rebuild_search_index(db.session.connection())
+        db.session.commit()
+        print("✓ 文章全文索引已重建")
+    else:
+        print("⚠️  当前数据库不是SQLite，搜索使用LIKE查询，无需建立索引")
+
+@app.cli.command('prune-logs')
+@click.option('--dry-run', is_flag=True, help='只统计将被清理的日志条数，不做修改')
+@click.option('--type', 'log_types', multiple=True, type=click.Choice(sorted(LOG_TABLES)),
+              help='只处理指定的日志表，可重复指定')
+def prune_logs_command(dry_run, log_types):
+    """按保留策略汇总、归档并删除过期的审核日志和发布日志"""
+    for name, result in run_retention(log_types=log_types, dry_run=dry_run).items():
+        if result['cutoff'] is None:
+            print(f"- {name}: 未配置保留天数，跳过")
+        elif dry_run:
+            print(f"- {name}: {result['cutoff']} 之前的日志共 {result['matched']} 条")
+        else:
+            print(f"✓ {name}: 汇总 {result['rolled_up']} 条，归档 {result['archived']} 条，删除 {result['deleted']} 条")
+            if result['archive_file']:
+                print(f"  归档文件: {result['archive_file']}")
+
 # 简单的用户数据存储（用于初始化）
 def init_default_user():
     """初始化默认用户"""
@@ -51,93 +94,6 @@ def init_default_user():
 def load_user(user_id):
     return User.query.get(int(user_id))
 
-class WordPressPublisher:
-    def __init__(self, wp_url, username, password):
-        self.wp_url = wp_url
-        self.username = username
-        self.password = password
-        self.client = None
-        self._categories_cache = {}
-        
-    def connect(self):
-        """连接到WordPress"""
-        try:
-            self.client = Client(f"{self.wp_url}/xmlrpc.php", self.username, self.password)
-            return True
-        except Exception as e:
-            print(f"WordPress连接失败: {e}")
-            return False
-    
-    def get_categories(self):
-        """获取WordPress分类列表"""
-        if not self.client and not self.connect():
-            return {}
-            
-        try:
-            # 获取所有分类
-            categories = self.client.call(GetTerms('category'))
-            category_dict = {}
-            
-            for category in categories:
-                category_dict[category.id] = {
-                    'name': category.name,
-                    'slug': category.slug,
-                    'description': getattr(category, 'description', ''),
-                    'count': getattr(category, 'count', 0)
-                }
-            
-            self._categories_cache = category_dict
-            return category_dict
-            
-        except Exception as e:
-            print(f"获取分类失败: {e}")
-            return {}
-    
-    def get_category_name(self, category_id):
-        """根据ID获取分类名称"""
-        if not self._categories_cache:
-            self.get_categories()
-        
-        category_info = self._categories_cache.get(int(category_id))
-        return category_info['name'] if category_info else None
-    
-    def publish_post(self, title, content, category_id=None):
-        """发布文章到WordPress"""
-        if not self.client and not self.connect():
-            return False
-            
-        try:
-            post = WordPressPost()
-            post.title = title
-            post.content = content
-            post.post_status = 'publish'
-            
-            if category_id:
-                # 方法1: 使用分类ID直接设置
-                post.terms = {
-                    'category': [int(category_id)]
-                }
-                
-                # 方法2: 如果方法1不工作，尝试使用分类名称
-                category_name = self.get_category_name(category_id)
-                if category_name:
-                    print(f"设置分类: ID={category_id}, 名称={category_name}")
-                    post.terms_names = {
-                        'category': [category_name]
-                    }
-                else:
-                    print(f"警告: 未找到分类ID {category_id} 对应的名称")
-            
-            post_id = self.client.call(NewPost(post))
-            print(f"文章发布成功，WordPress文章ID: {post_id}")
-            return post_id
-            
-        except Exception as e:
-            print(f"发布失败: {e}")
-            import traceback
-            traceback.print_exc()
-            return False
-
 @app.route('/')
 def index():
     return redirect(url_for('login'))
@@ -164,40 +120,45 @@ def logout():
     logout_user()
     return redirect(url_for('login'))
 
-@app.route('/dashboard')
-@login_required
-def dashboard():
-    # 获取用户的文章，支持分页和筛选
-    page = request.args.get('page', 1, type=int)
-    status = request.args.get('status', 'all')
-    search = request.args.get('search', '')
-    
-    # 构建查询
-    query = Article.query.filter_by(user_id=current_user.id)
+def _article_list_query(user_id, status='all', search='', tag='', include_content=False):
+    """文章列表查询（状态、标签、搜索筛选），返回 (query, 搜索相关度表达式或None)"""
+    query = Article.query.options(*Article.list_options(include_content)).filter_by(user_id=user_id)
     
     # 状态筛选
-    if status != 'all':
+    if status and status != 'all':
         query = query.filter_by(status=status)
     
-    # 搜索筛选
+    # 标签筛选
+    if tag:
+        query = query.filter(Article.tags.any(Tag.name == tag))
+    
+    # 搜索筛选（有全文索引时按相关度排序）
     if search:
-        query = query.filter(Article.title.contains(search))
+        return apply_search(query, Article, search, db.session)
+    return query, None
+
+@app.route('/dashboard')
+@login_required
+def dashboard():
+    # 获取用户的文章，支持游标分页和筛选
+    cursor = request.args.get('cursor', '')
+    status = request.args.get('status', 'all')
+    search = request.args.get('search', '')
     
-    # 排序和分页
-    articles = query.order_by(Article.updated_at.desc()).paginate(
-        page=page, per_page=12, error_out=False
-    )
+    # 搜索时需要正文生成高亮片段
+    query, rank = _article_list_query(current_user.id, status, search, include_content=bool(search))
+    try:
+        articles = keyset_paginate(query, Article, cursor, per_page=12, rank=rank)
+    except InvalidCursor:
+        articles = keyset_paginate(query, Article, per_page=12, rank=rank)
+        cursor = ''
+    snippets = {article.id: make_snippet(article.content, search) for article in articles.items} if search else {}
     
     # 统计信息
-    stats = {
-        'total': Article.query.filter_by(user_id=current_user.id).count(),
-        'published': Article.query.filter_by(user_id=current_user.id, status='published').count(),
-        'draft': Article.query.filter_by(user_id=current_user.id, status='draft').count(),
-        'archived': Article.query.filter_by(user_id=current_user.id, status='archived').count(),
-    }
+    stats = Article.stats_for_user(current_user.id)
     
     return render_template('dashboard.html', articles=articles, stats=stats, 
-                         current_status=status, search=search)
+                         current_status=status, search=search, snippets=snippets, cursor=cursor)
 
 @app.route('/editor')
 @app.route('/editor/<int:article_id>')
@@ -276,37 +237,51 @@ def save_article():
                 'message': '标题和内容不能为空'
             })
         
-        # 使用DeepSeek审核标题和内容
+        article = None
+        if article_id:
+            article = Article.query.filter_by(id=article_id, user_id=current_user.id).first()
+            if not article:
+                print("错误: 文章不存在或无权限")
+                return jsonify({
+                    'success': False,
+                    'message': '文章不存在或无权限访问'
+                })
+        
+        # 使用DeepSeek审核标题和内容；正文只提取一次，预过滤、字数和摘要共用
         full_content = f"{title} {content}"
-        print("开始审核内容...")
-        try:
-            audit_result = audit_service.audit_content(full_content, strict_level)
-            print(f"审核结果: {audit_result}")
-        except Exception as e:
-            print(f"审核服务错误: {e}")
-            # 如果审核失败，使用默认通过结果
-            audit_result = {
-                'passed': True,
-                'score': 0.1,
-                'risk_level': 'low',
-                'reasons': [],
-                'suggestions': [],
-                'flagged_keywords': []
-            }
+        extracted = extract_text(content)
+        full_plain = f"{title} {extracted.text}"
+        fingerprint = content_fingerprint(full_content)
+        async_audit = data.get('async_audit', DEEPSEEK_CONFIG.get('async_audit', False))
+        
+        # 标题、内容和严格级别都未变化时直接复用数据库中的审核结果
+        audit_result = article.stored_audit_result(fingerprint, strict_level) if article else None
+        audit_reused = audit_result is not None
+        if audit_reused:
+            print("内容未变化，复用已保存的审核结果")
+        elif not async_audit:
+            print("开始审核内容...")
+            try:
+                audit_result = audit_service.audit_content(full_content, strict_level, plain=full_plain)
+                print(f"审核结果: {audit_result}")
+            except Exception as e:
+                print(f"审核服务错误: {e}")
+                # 如果审核失败，使用默认通过结果
+                audit_result = {
+                    'passed': True,
+                    'score': 0.1,
+                    'risk_level': 'low',
+                    'reasons': [],
+                    'suggestions': [],
+                    'flagged_keywords': [],
+                    'fallback': True
+                }
         
         print("开始数据库操作...")
         try:
-            if article_id:
+            if article:
                 print(f"更新现有文章: {article_id}")
                 # 更新现有文章
-                article = Article.query.filter_by(id=article_id, user_id=current_user.id).first()
-                if not article:
-                    print("错误: 文章不存在或无权限")
-                    return jsonify({
-                        'success': False,
-                        'message': '文章不存在或无权限访问'
-                    })
-                
                 article.title = title
                 article.content = content
                 article.updated_at = datetime.utcnow()
@@ -324,55 +299,53 @@ def save_article():
                 db.session.flush()
                 print(f"新文章ID: {article.id}")
             
-            # 更新审核信息
-            article.audit_score = audit_result['score']
-            article.risk_level = audit_result['risk_level']
-            article.audit_reasons = json.dumps(audit_result['reasons'], ensure_ascii=False)
-            article.audit_suggestions = json.dumps(audit_result['suggestions'], ensure_ascii=False)
-            article.flagged_keywords = json.dumps(audit_result['flagged_keywords'], ensure_ascii=False)
+            # 更新审核信息（异步模式下先标记为待审核，复用已有结果时保持不变）
+            if audit_result is None:
+                article.audit_status = 'pending'
+            elif not audit_reused:
+                article.apply_audit_result(
+                    audit_result,
+                    None if audit_result.get('fallback') else fingerprint,
+                    strict_level
+                )
+                audit_jobs.supersede(article.id)
             
             # 更新字数和摘要
-            article.update_word_count()
-            article.generate_summary()
+            article.update_word_count(extracted)
+            article.generate_summary(extracted=extracted)
             print(f"文章字数: {article.word_count}")
             
             # 处理标签
             print(f"处理标签: {tags_data}")
             
-            # 使用标准的SQLAlchemy方法处理多对多关系
-            # 先清空现有标签
-            article.tags = []
+            # 一次查询取得已有标签，缺少的批量创建，关联只增删有变化的部分
+            article.set_tags(Tag.resolve(tags_data))
             
-            # 添加新标签
-            for tag_name in tags_data:
-                tag_name = tag_name.strip()
-                if tag_name:
-                    tag = Tag.query.filter_by(name=tag_name).first()
-                    if not tag:
-                        tag = Tag(name=tag_name)
-                        db.session.add(tag)
-                        db.session.flush()  # 确保tag有ID
-                    article.tags.append(tag)
+            # 记录修订历史（内容未变化时不记录）；修订失败只记录日志，不影响文章保存
+            if REVISION_CONFIG['enabled']:
+                try:
+                    record_revision(article, current_user.id)
+                except Exception as e:
+                    print(f"记录修订失败: article_id={article.id}, {e}")
             
-            # 记录审核日志
-            audit_log = AuditLog(
-                article_id=article.id,
-                user_id=current_user.id,
-                passed=audit_result['passed'],
-                score=audit_result['score'],
-                risk_level=audit_result['risk_level'],
-                reasons=json.dumps(audit_result['reasons'], ensure_ascii=False),
-                suggestions=json.dumps(audit_result['suggestions'], ensure_ascii=False),
-                flagged_keywords=json.dumps(audit_result['flagged_keywords'], ensure_ascii=False),
-                strict_level=strict_level,
-                audit_type='auto'
-            )
-            db.session.add(audit_log)
+            # 记录审核日志（复用已有结果时不重复记录）
+            if audit_result is not None and not audit_reused:
+                db.session.add(AuditLog.from_audit_result(article, current_user.id, audit_result, strict_level))
             
             print("提交数据库事务...")
             db.session.commit()
             print("数据库操作成功")
             
+            if audit_result is None:
+                # 文章已提交，审核在后台完成后写回
+                audit_jobs.submit(article.id, current_user.id, full_content, strict_level, full_plain)
+                return jsonify({
+                    'success': True,
+                    'message': '文章已保存，正在后台审核',
+                    'article_id': article.id,
+                    'audit_status': 'pending'
+                })
+            
             if not audit_result['passed']:
                 print("审核未通过，返回失败结果")
                 return jsonify({
@@ -414,6 +387,58 @@ def save_article():
             'message': f'服务器错误: {str(e)}'
         })
 
+def _audit_status_payload(article):
+    """文章审核状态及结果（含最近一次审核是否通过）"""
+    payload = article.audit_info()
+    if article.audit_status == 'done' and payload['passed'] is None:
+        latest_log = AuditLog.query.filter_by(article_id=article.id).order_by(AuditLog.id.desc()).first()
+        payload['passed'] = latest_log.passed if latest_log else True
+    return payload
+
+@app.route('/api/audit_status/<int:article_id>')
+@login_required
+def audit_status(article_id):
+    """查询文章审核状态"""
+    article = Article.query.filter_by(id=article_id, user_id=current_user.id).first()
+    if not article:
+        return jsonify({'success': False, 'message': '文章不存在或无权限访问'})
+    
+    # 重启前排队的任务已丢失时不再一直显示待审核
+    if article.audit_status == 'pending':
+        audit_jobs.recover_stale(article.id)
+    
+    return jsonify(dict(_audit_status_payload(article), success=True))
+
+@app.route('/api/audit_stream/<int:article_id>')
+@login_required
+def audit_stream(article_id):
+    """以SSE推送文章审核结果，审核完成或超时后结束"""
+    article = Article.query.filter_by(id=article_id, user_id=current_user.id).first()
+    if not article:
+        return jsonify({'success': False, 'message': '文章不存在或无权限访问'})
+    
+    if article.audit_status == 'pending':
+        audit_jobs.recover_stale(article.id)
+    
+    timeout = DEEPSEEK_CONFIG.get('background_timeout', 120)
+    
+    def generate():
+        deadline = time.time() + timeout
+        while True:
+            db.session.expire_all()
+            current = db.session.get(Article, article_id)
+            if current is None:
+                return
+            if current.audit_status != 'pending' or time.time() >= deadline:
+                payload = _audit_status_payload(current)
+                yield f"event: audit\ndata: {json.dumps(payload, ensure_ascii=False)}\n\n"
+                return
+            yield ": waiting\n\n"
+            time.sleep(0.5)
+    
+    return Response(stream_with_context(generate()), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
 @app.route('/api/get_wp_categories', methods=['POST'])
 @login_required
 def get_wp_categories():
@@ -428,7 +453,8 @@ def get_wp_categories():
         })
     
     try:
-        wp_publisher = WordPressPublisher(
+        # 同一站点和账号复用客户端和长连接
+        wp_publisher = get_publisher(
             wp_config.get('url'),
             wp_config.get('username'),
             wp_config.get('password')
@@ -480,7 +506,7 @@ def publish_article():
     
     try:
         # WordPress发布
-        wp_publisher = WordPressPublisher(
+        wp_publisher = get_publisher(
             wp_config.get('url', ''),
             wp_config.get('username', ''),
             wp_config.get('password', '')
@@ -554,25 +580,8 @@ def delete_article(article_id):
     try:
         print(f"开始删除文章: {article.title}")
         
-        # 手动删除相关的审核日志
-        audit_logs = AuditLog.query.filter_by(article_id=article_id).all()
-        for log in audit_logs:
-            db.session.delete(log)
-        print(f"删除了 {len(audit_logs)} 条审核日志")
-        
-        # 手动删除相关的发布日志
-        publish_logs = PublishLog.query.filter_by(article_id=article_id).all()
-        for log in publish_logs:
-            db.session.delete(log)
-        print(f"删除了 {len(publish_logs)} 条发布日志")
-        
-        # 清除标签关联
-        article.tags = []
-        print("清除了标签关联")
-        
-        # 删除文章
-        db.session.delete(article)
-        db.session.commit()
+        # 审核日志、发布日志和修订随文章删除（外键没有级联时显式删除）
+        bulk_delete(current_user.id, ids=[article_id])
         
         print("文章删除成功")
         return jsonify({'success': True, 'message': '文章删除成功'})
@@ -616,19 +625,100 @@ def restore_article(article_id):
         db.session.rollback()
         return jsonify({'success': False, 'message': f'恢复失败: {str(e)}'})
 
+def _bulk_request():
+    """批量操作请求体：{"ids": [...]} 或 {"filter": {"status": ..., "tag": ..., "updated_before": ...}}"""
+    data = request.get_json(silent=True) or {}
+    return data.get('ids'), data.get('filter')
+
+@app.route('/api/articles/bulk_delete', methods=['POST'])
+@login_required
+def bulk_delete_articles():
+    """批量删除文章"""
+    try:
+        ids, filters = _bulk_request()
+        count = bulk_delete(current_user.id, ids, filters)
+        return jsonify({'success': True, 'count': count, 'message': f'已删除 {count} 篇文章'})
+    except BulkRequestError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'success': False, 'message': f'批量删除失败: {str(e)}'})
+
+@app.route('/api/articles/bulk_<action>', methods=['POST'])
+@login_required
+def bulk_update_articles(action):
+    """批量归档（bulk_archive）或恢复（bulk_restore）文章"""
+    if action not in ('archive', 'restore'):
+        return jsonify({'success': False, 'message': '不支持的批量操作'}), 404
+    try:
+        ids, filters = _bulk_request()
+        count = bulk_set_status(current_user.id, action, ids, filters)
+        label = '归档' if action == 'archive' else '恢复'
+        return jsonify({'success': True, 'count': count, 'message': f'已{label} {count} 篇文章'})
+    except BulkRequestError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'success': False, 'message': f'批量操作失败: {str(e)}'})
+
+@app.route('/api/articles')
+@login_required
+def list_articles():
+    """文章列表（游标分页），支持 status、tag、search 筛选，用返回的 next_cursor / prev_cursor 取下一页、上一页"""
+    limit = min(max(request.args.get('limit', 20, type=int), 1), 100)
+    query, rank = _article_list_query(
+        current_user.id,
+        request.args.get('status', 'all'),
+        request.args.get('search', ''),
+        request.args.get('tag', '')
+    )
+    try:
+        page = keyset_paginate(query, Article, request.args.get('cursor'), per_page=limit, rank=rank)
+    except InvalidCursor:
+        return jsonify({'success': False, 'message': '无效的分页游标'}), 400
+    
+    return jsonify({
+        'success': True,
+        'articles': [article.to_dict(include_content=False) for article in page.items],
+        'next_cursor': page.next_cursor,
+        'prev_cursor': page.prev_cursor
+    })
+
+@app.route('/api/articles/<int:article_id>/revisions')
+@login_required
+def article_revisions(article_id):
+    """文章的修订列表（新的在前）"""
+    article = Article.query.filter_by(id=article_id, user_id=current_user.id).first()
+    if not article:
+        return jsonify({'success': False, 'message': '文章不存在或无权限访问'})
+    
+    return jsonify({'success': True, 'revisions': [revision.to_dict() for revision in list_revisions(article_id)]})
+
+@app.route('/api/articles/<int:article_id>/revisions/<int:revision>')
+@login_required
+def article_revision(article_id, revision):
+    """还原文章的某个修订"""
+    article = Article.query.filter_by(id=article_id, user_id=current_user.id).first()
+    if not article:
+        return jsonify({'success': False, 'message': '文章不存在或无权限访问'})
+    
+    try:
+        title, content = load_revision(article_id, revision)
+    except RevisionNotFound:
+        return jsonify({'success': False, 'message': '修订不存在'}), 404
+    return jsonify({'success': True, 'revision': revision, 'title': title, 'content': content})
+
 @app.route('/api/article_stats')
 @login_required
 def article_stats():
     """获取文章统计信息"""
-    stats = {
-        'total': Article.query.filter_by(user_id=current_user.id).count(),
-        'published': Article.query.filter_by(user_id=current_user.id, status='published').count(),
-        'draft': Article.query.filter_by(user_id=current_user.id, status='draft').count(),
-        'archived': Article.query.filter_by(user_id=current_user.id, status='archived').count(),
-        'total_words': db.session.query(db.func.sum(Article.word_count)).filter_by(user_id=current_user.id).scalar() or 0,
-        'total_views': db.session.query(db.func.sum(Article.view_count)).filter_by(user_id=current_user.id).scalar() or 0
-    }
-    return jsonify(stats)
+    return jsonify(Article.stats_for_user(current_user.id))
+
+@app.route('/api/audit_stats')
+@login_required
+def audit_stats():
+    """获取审核服务统计信息（缓存命中率等）"""
+    return jsonify(dict(audit_service.get_stats(), jobs=audit_jobs.stats()))
 
 @app.route('/api/tags')
 @login_required
@@ -679,6 +769,10 @@ if __name__ == '__main__':
             print("✅ 数据库初始化完成")
         else:
             print("✅ 数据库文件已存在")
+            # 上次运行时排队的后台审核任务已随进程结束丢失
+            recovered = audit_jobs.recover_stale()
+            if recovered:
+                print(f"⚠️  {recovered} 篇文章的后台审核任务已丢失，已标记为审核失败，下次保存时重新审核")
     
     print("🚀 应用启动:")
     print(f"   本地访问: http://127.0.0.1:{SERVER_CONFIG['port']}")
@@ -0,0 +1,186 @@
+"""
+文章批量操作
+按ID列表或筛选条件批量删除、归档、恢复文章。直接执行集合式 DELETE/UPDATE，
+不把文章和日志逐条加载到会话中；按块提交，单个事务不会长时间持有写锁
+"""
+
+from datetime import datetime
+
+from sqlalchemy import case, func, inspect, text
+
+from models import (db, Article, ArticleRevision, Tag, AuditLog, PublishLog, UserArticleStats, article_tags,
+                    ARTICLE_STATUSES)
+
+# 每个事务处理的文章数
+CHUNK_SIZE = 500
+
+# 支持的筛选条件
+FILTER_KEYS = ('status', 'tag', 'updated_before')
+
+
+class BulkRequestError(ValueError):
+    """批量操作参数错误"""
+
+
+def select_article_ids(user_id, ids=None, filters=None):
+    """取得当前用户名下要处理的文章ID
+
+    ids 与 filters 至少提供一个；同时提供时取交集。不接受空条件，避免误操作全部文章。
+    """
+    if not ids and not filters:
+        raise BulkRequestError('请提供文章ID列表或筛选条件')
+
+    query = db.session.query(Article.id).filter(Article.user_id == user_id)
+    if ids:
+        try:
+            ids = [int(article_id) for article_id in ids]
+        except (TypeError, ValueError):
+            raise BulkRequestError('文章ID必须是整数')
+        query = query.filter(Article.id.in_(ids))
+
+    for key, value in (filters or {}).items():
+        if key not in FILTER_KEYS:
+            raise BulkRequestError(f'不支持的筛选条件: {key}')
+        if key == 'status':
+            query = query.filter(Article.status == value)
+        elif key == 'tag':
+            query = query.filter(Article.tags.any(Tag.name == value))
+        elif key == 'updated_before':
+            try:
+                query = query.filter(Article.updated_at < datetime.fromisoformat(value))
+            except (TypeError, ValueError):
+                raise BulkRequestError('updated_before 需为ISO格式日期，如 2024-01-01')
+
+    return [row.id for row in query.order_by(Article.id)]
+
+
+def _chunks(ids, size):
+    for start in range(0, len(ids), size):
+        yield ids[start:start + size]
+
+
+# 引用文章的子表：删除文章前需要先删除（外键有 ON DELETE CASCADE 时由数据库删除）
+CHILD_MODELS = (AuditLog, PublishLog, ArticleRevision)
+
+
+def _cascades(table_name):
+    """表引用 articles 的外键是否都是 ON DELETE CASCADE"""
+    connection = db.session.connection()
+    if connection.dialect.name == 'sqlite':
+        rules = [row[6] for row in connection.execute(text(f'PRAGMA foreign_key_list({table_name})'))
+                 if row[2] == 'articles']
+    else:
+        rules = [(fk.get('options') or {}).get('ondelete') for fk in inspect(connection).get_foreign_keys(table_name)
+                 if fk['referred_table'] == 'articles']
+    return bool(rules) and all((rule or '').upper() == 'CASCADE' for rule in rules)
+
+
+def _tables_to_clear():
+    """删除文章前需要显式删除的子表
+
+    SQLite未开启外键约束时级联不生效；按旧表结构建立、还没用 fix_database.py 重建的库
+    外键约束开启但没有级联，直接删除文章会违反外键约束。只有外键确实是 CASCADE 的表才交给数据库。
+    """
+    connection = db.session.connection()
+    inspector = inspect(connection)
+    models = [model for model in CHILD_MODELS if inspector.has_table(model.__tablename__)]
+    if connection.dialect.name == 'sqlite' and not connection.execute(text('PRAGMA foreign_keys')).scalar():
+        return models
+    return [model for model in models if not _cascades(model.__tablename__)]
+
+
+def _chunk_groups(user_id, chunk, condition=None):
+    """块内将被处理的文章按 (状态, 是否发布过) 分组的篇数、字数和浏览量"""
+    articles = Article.__table__
+    query = db.select(
+        articles.c.status, articles.c.is_published, func.count(),
+        func.coalesce(func.sum(articles.c.word_count), 0), func.coalesce(func.sum(articles.c.view_count), 0)
+    ).where(articles.c.id.in_(chunk), articles.c.user_id == user_id)
+    if condition is not None:
+        query = query.where(condition)
+    return db.session.execute(query.group_by(articles.c.status, articles.c.is_published)).all()
+
+
+def _apply_stats(user_id, groups, new_status=None):
+    """集合式语句不触发ORM事件，按块内分组的增量更新统计表（与删除/更新在同一事务中提交）
+
+    new_status 为空表示删除这些文章，否则为 (旧状态, 是否发布过) -> 新状态 的函数。
+    """
+    delta = dict.fromkeys(('total', 'total_words', 'total_views') + ARTICLE_STATUSES, 0)
+    for status, published, count, words, views in groups:
+        if status in delta:
+            delta[status] -= count
+        if new_status is None:
+            delta['total'] -= count
+            delta['total_words'] -= words
+            delta['total_views'] -= views
+        else:
+            delta[new_status(status, published)] += count
+    UserArticleStats.apply_delta(user_id, delta)
+
+
+def bulk_delete(user_id, ids=None, filters=None, chunk_size=CHUNK_SIZE):
+    """批量删除文章，返回删除数量
+
+    审核日志、发布日志和修订在外键有 ON DELETE CASCADE 时由数据库删除，否则先显式删除；
+    标签关联表没有级联，先删除关联。
+    """
+    article_ids = select_article_ids(user_id, ids, filters)
+    if not article_ids:
+        return 0
+    to_clear = _tables_to_clear()
+    track_stats = UserArticleStats.enabled()
+    deleted = 0
+    for chunk in _chunks(article_ids, chunk_size):
+        try:
+            if track_stats:
+                _apply_stats(user_id, _chunk_groups(user_id, chunk))
+            db.session.execute(article_tags.delete().where(article_tags.c.article_id.in_(chunk)))
+            for model in to_clear:
+                db.session.execute(model.__table__.delete().where(model.article_id.in_(chunk)))
+            result = db.session.execute(
+                Article.__table__.delete().where(Article.id.in_(chunk), Article.user_id == user_id)
+            )
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+        deleted += result.rowcount
+    return deleted
+
+
+def bulk_set_status(user_id, action, ids=None, filters=None, chunk_size=CHUNK_SIZE):
+    """批量归档（action='archive'）或恢复（action='restore'）文章，返回更新数量
+
+    恢复只处理已归档的文章：发布过的恢复为published，否则恢复为draft。
+    """
+    articles = Article.__table__
+    if action == 'archive':
+        condition = articles.c.status != 'archived'
+        status = 'archived'
+        new_status = lambda old_status, published: 'archived'
+    elif action == 'restore':
+        condition = articles.c.status == 'archived'
+        status = case((articles.c.is_published == True, 'published'), else_='draft')  # noqa: E712
+        new_status = lambda old_status, published: 'published' if published else 'draft'
+    else:
+        raise BulkRequestError(f'不支持的操作: {action}')
+
+    article_ids = select_article_ids(user_id, ids, filters)
+    track_stats = UserArticleStats.enabled()
+    updated = 0
+    for chunk in _chunks(article_ids, chunk_size):
+        try:
+            if track_stats:
+                _apply_stats(user_id, _chunk_groups(user_id, chunk, condition), new_status)
+            result = db.session.execute(
+                articles.update()
+                .where(articles.c.id.in_(chunk), articles.c.user_id == user_id, condition)
+                .values(status=status, updated_at=datetime.utcnow())
+            )
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+        updated += result.rowcount
+    return updated
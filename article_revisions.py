@@ -0,0 +1,198 @@
+"""
+文章修订历史
+每次保存文章记录一个修订：每 snapshot_interval 个修订保存一次完整快照，其余只保存相对上一修订的差异
+（按行和句末标点切分后的“复制区间 + 新增文本”），超过 compress_min_bytes 的内容再用 zlib/zstd 压缩。
+文章当前内容仍完整保存在 articles.content 中，读取当前版本不经过修订表
+"""
+
+import json
+import re
+import zlib
+from difflib import SequenceMatcher
+
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import defer
+
+from article_text import content_key
+from config import REVISION_CONFIG
+from models import db, ArticleRevision
+
+# 修订号被并发保存占用时重新分配的次数
+MAX_NUMBER_RETRIES = 3
+
+# 差异的切分粒度：换行和中英文句末标点之后
+_TOKEN_SPLIT_RE = re.compile(r'(?<=[\n。！？；!?;])')
+
+
+class RevisionNotFound(LookupError):
+    """修订不存在"""
+
+
+def _tokens(text):
+    return [token for token in _TOKEN_SPLIT_RE.split(text) if token]
+
+
+def make_delta(base, content):
+    """content 相对 base 的差异
+
+    返回操作列表：[起, 止] 表示复制 base 中第起到止个片段，字符串表示新增的文本。
+    """
+    base_tokens = _tokens(base)
+    tokens = _tokens(content)
+    ops = []
+    for tag, i1, i2, j1, j2 in SequenceMatcher(None, base_tokens, tokens, autojunk=False).get_opcodes():
+        if tag == 'equal':
+            ops.append([i1, i2])
+        elif j2 > j1:
+            ops.append(''.join(tokens[j1:j2]))
+    return ops
+
+
+def apply_delta(base, ops):
+    """按 make_delta 的结果由 base 还原内容"""
+    base_tokens = _tokens(base)
+    return ''.join(op if isinstance(op, str) else ''.join(base_tokens[op[0]:op[1]]) for op in ops)
+
+
+def _zstd():
+    try:
+        import zstandard
+    except ImportError:
+        raise RuntimeError('zstd压缩需要安装 zstandard: pip install zstandard')
+    return zstandard
+
+
+def _encode(raw, compression):
+    """较大的内容按配置压缩，压缩后没有变小则保存原文"""
+    if len(raw) < REVISION_CONFIG['compress_min_bytes']:
+        return 'raw', raw
+    if compression == 'zstd':
+        compressed = _zstd().ZstdCompressor().compress(raw)
+    elif compression == 'zlib':
+        compressed = zlib.compress(raw, 6)
+    else:
+        return 'raw', raw
+    if len(compressed) >= len(raw):
+        return 'raw', raw
+    return compression, compressed
+
+
+def _decode(encoding, data):
+    if encoding == 'zlib':
+        return zlib.decompress(data)
+    if encoding == 'zstd':
+        return _zstd().ZstdDecompressor().decompress(data)
+    return data
+
+
+def _latest(article_id):
+    return ArticleRevision.query.filter_by(article_id=article_id) \
+        .order_by(ArticleRevision.revision.desc()).first()
+
+
+def load_revision(article_id, revision):
+    """还原文章的某个修订，返回 (标题, 正文)
+
+    从不晚于该修订的最近一次快照开始，依次应用之后的差异（至多 snapshot_interval - 1 个）。
+    """
+    snapshot = ArticleRevision.query.filter(
+        ArticleRevision.article_id == article_id,
+        ArticleRevision.revision <= revision,
+        ArticleRevision.kind == 'snapshot'
+    ).order_by(ArticleRevision.revision.desc()).first()
+    if snapshot is None:
+        raise RevisionNotFound(f'文章 {article_id} 没有修订 {revision}')
+
+    content = _decode(snapshot.encoding, snapshot.data).decode('utf-8')
+    current = snapshot
+    for delta in ArticleRevision.query.filter(
+        ArticleRevision.article_id == article_id,
+        ArticleRevision.revision > snapshot.revision,
+        ArticleRevision.revision <= revision
+    ).order_by(ArticleRevision.revision):
+        content = apply_delta(content, json.loads(_decode(delta.encoding, delta.data)))
+        current = delta
+    if current.revision != revision:
+        raise RevisionNotFound(f'文章 {article_id} 没有修订 {revision}')
+    return current.title, content
+
+
+def _content_hash(content):
+    return content_key(content).hex()
+
+
+def _build_revision(article, user_id, config):
+    """按当前最新修订构造下一个修订，内容未变化时返回 None
+
+    最新修订记录了正文摘要时，正文未变化（只改标题）不需要还原上一修订：
+    差异就是整段复制。只有正文变化且需要保存差异时才还原上一修订。
+    """
+    content = article.content or ''
+    content_hash = _content_hash(content)
+    latest = _latest(article.id)
+    if latest is None:
+        number, previous = 1, None
+    else:
+        if latest.content_hash is None:
+            title, previous = load_revision(article.id, latest.revision)
+            unchanged = previous == content
+        else:
+            title, previous = latest.title, None
+            unchanged = latest.content_hash == content_hash
+        if unchanged:
+            if title == article.title:
+                return None
+            previous = content
+        number = latest.revision + 1
+
+    kind, raw = 'snapshot', content.encode('utf-8')
+    if latest is not None and (number - 1) % config['snapshot_interval'] != 0:
+        if previous is None:
+            previous = load_revision(article.id, latest.revision)[1]
+        delta = json.dumps(make_delta(previous, content), ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+        # 改动很大时差异可能比全文还大，直接保存快照
+        if len(delta) < len(raw):
+            kind, raw = 'delta', delta
+    encoding, data = _encode(raw, config['compression'])
+
+    return ArticleRevision(
+        article_id=article.id,
+        user_id=user_id,
+        revision=number,
+        title=article.title,
+        kind=kind,
+        encoding=encoding,
+        data=data,
+        content_length=len(content),
+        content_hash=content_hash
+    )
+
+
+def record_revision(article, user_id=None, config=None):
+    """为文章当前的标题和正文记录一个修订（随调用方的事务提交），内容未变化时返回 None
+
+    文章需已有ID（新文章先 flush）。修订在SAVEPOINT中写入：同一文章的并发保存占用了同一个修订号时
+    只回滚这一条修订，重新读取最新修订后换下一个修订号重试，不影响调用方事务中的其他修改。
+    """
+    config = config or REVISION_CONFIG
+    # 文章自身的修改先写入，之后的 IntegrityError 只可能来自修订号冲突
+    db.session.flush()
+    for attempt in range(MAX_NUMBER_RETRIES):
+        revision = _build_revision(article, user_id, config)
+        if revision is None:
+            return None
+        try:
+            with db.session.begin_nested():
+                db.session.add(revision)
+        except IntegrityError:
+            print(f"修订号 {revision.revision} 已被并发保存占用，重试: article_id={article.id}")
+            continue
+        return revision
+    raise RuntimeError(f'文章 {article.id} 的修订号连续冲突 {MAX_NUMBER_RETRIES} 次')
+
+
+def list_revisions(article_id):
+    """文章的修订列表（新的在前），不加载修订内容"""
+    return ArticleRevision.query.filter_by(article_id=article_id) \
+        .options(defer(ArticleRevision.data)) \
+        .order_by(ArticleRevision.revision.desc()).all()
@@ -0,0 +1,195 @@
+"""
+文章全文搜索
+基于SQLite FTS5，中文按相邻两字（bigram）切分后交给 unicode61 分词器建立索引；
+非SQLite数据库或未建立索引时回退为 LIKE 查询
+"""
+
+import re
+import sqlite3
+
+from markupsafe import Markup, escape
+from sqlalchemy import event, or_, table, column, func, text
+from sqlalchemy.engine import Engine
+
+from article_text import MEMO_MIN_LENGTH, ContentMemo, content_key, plain_text
+
+# 中日韩文字（汉字、假名、谚文）连续片段
+_CJK_RUN_RE = re.compile(r'[\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff\uac00-\ud7af]+')
+
+# 标题、摘要、正文在排序中的权重（bm25越小越相关）
+RANK_WEIGHTS = (10.0, 5.0, 1.0)
+
+# contentless表只保存倒排索引，摘要片段从articles表原文生成
+SEARCH_INDEX_DDL = [
+    """CREATE VIRTUAL TABLE IF NOT EXISTS articles_fts USING fts5(
+        title, summary, content, content='', tokenize='unicode61'
+    )""",
+    """CREATE TRIGGER IF NOT EXISTS articles_fts_ai AFTER INSERT ON articles BEGIN
+        INSERT INTO articles_fts(rowid, title, summary, content)
+        VALUES (new.id, cjk_tokens(new.title), cjk_tokens(new.summary), cjk_tokens(new.content));
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS articles_fts_ad AFTER DELETE ON articles BEGIN
+        INSERT INTO articles_fts(articles_fts, rowid, title, summary, content)
+        VALUES ('delete', old.id, cjk_tokens(old.title), cjk_tokens(old.summary), cjk_tokens(old.content));
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS articles_fts_au AFTER UPDATE OF title, summary, content ON articles BEGIN
+        INSERT INTO articles_fts(articles_fts, rowid, title, summary, content)
+        VALUES ('delete', old.id, cjk_tokens(old.title), cjk_tokens(old.summary), cjk_tokens(old.content));
+        INSERT INTO articles_fts(rowid, title, summary, content)
+        VALUES (new.id, cjk_tokens(new.title), cjk_tokens(new.summary), cjk_tokens(new.content));
+    END""",
+]
+
+DROP_SEARCH_INDEX_DDL = [
+    "DROP TRIGGER IF EXISTS articles_fts_au",
+    "DROP TRIGGER IF EXISTS articles_fts_ad",
+    "DROP TRIGGER IF EXISTS articles_fts_ai",
+    "DROP TABLE IF EXISTS articles_fts",
+]
+
+REBUILD_SEARCH_INDEX_SQL = [
+    "INSERT INTO articles_fts(articles_fts) VALUES ('delete-all')",
+    """INSERT INTO articles_fts(rowid, title, summary, content)
+       SELECT id, cjk_tokens(title), cjk_tokens(summary), cjk_tokens(content) FROM articles""",
+]
+
+articles_fts = table('articles_fts', column('rowid'), column('articles_fts'))
+
+# 正文的索引词序列缓存（词序列约为纯文本的两到三倍长，条数少于提取结果缓存）
+_token_memo = ContentMemo(max_entries=64)
+
+
+def _bigrams(match) -> str:
+    run = match.group(0)
+    if len(run) == 1:
+        return f' {run} '
+    return ' ' + ' '.join(run[i:i + 2] for i in range(len(run) - 1)) + ' '
+
+
+def _tokenize(value):
+    return _CJK_RUN_RE.sub(_bigrams, plain_text(value))
+
+
+def cjk_tokens(value):
+    """把文本转换为索引用的词序列：提取纯文本（去掉HTML/Markdown标记），中文连续片段切成相邻两字
+
+    纯文本复用保存时计算字数和摘要的提取结果；词序列也按内容摘要缓存，
+    更新触发器删除旧正文的索引时，旧正文的词序列通常在上次保存时已经算过。
+    """
+    if value is None:
+        return None
+    if len(value) < MEMO_MIN_LENGTH:
+        return _tokenize(value)
+    key = content_key(value)
+    tokens = _token_memo.get(key)
+    if tokens is None:
+        tokens = _tokenize(value)
+        _token_memo.put(key, tokens)
+    return tokens
+
+
+@event.listens_for(Engine, 'connect')
+def _register_sqlite_functions(dbapi_connection, connection_record):
+    """触发器中用到的 cjk_tokens() 需要在每个SQLite连接上注册"""
+    if isinstance(dbapi_connection, sqlite3.Connection):
+        dbapi_connection.create_function('cjk_tokens', 1, cjk_tokens, deterministic=True)
+
+
+def search_terms(search: str):
+    """拆分搜索词（按空白分隔）"""
+    return [term for term in search.split() if term]
+
+
+def build_match_query(search: str):
+    """生成FTS5 MATCH表达式，每个搜索词作为一个短语，多个词之间为AND
+
+    单个汉字无法用bigram索引匹配，返回None由调用方回退为LIKE查询。
+    """
+    phrases = []
+    for term in search_terms(search):
+        tokens = cjk_tokens(term).split()
+        if not tokens:
+            continue
+        if any(len(token) == 1 and _CJK_RUN_RE.fullmatch(token) for token in tokens):
+            return None
+        phrases.append('"' + ' '.join(tokens).replace('"', '""') + '"')
+    return ' '.join(phrases) or None
+
+
+def search_index_available(session) -> bool:
+    """当前数据库是否为SQLite且已建立全文索引"""
+    if session.get_bind().dialect.name != 'sqlite':
+        return False
+    return session.execute(text(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'articles_fts'"
+    )).first() is not None
+
+
+def create_search_index(connection, rebuild: bool = True):
+    """创建全文索引表和同步触发器（仅SQLite），rebuild时按现有文章重建索引"""
+    if connection.dialect.name != 'sqlite':
+        return False
+    for statement in SEARCH_INDEX_DDL:
+        connection.execute(text(statement))
+    if rebuild:
+        rebuild_search_index(connection)
+    return True
+
+
+def rebuild_search_index(connection):
+    """清空并按articles表重建全文索引（修改分词规则后需要执行）"""
+    for statement in REBUILD_SEARCH_INDEX_SQL:
+        connection.execute(text(statement))
+
+
+def apply_search(query, model, search: str, session):
+    """为文章查询加上搜索条件
+
+    返回 (query, rank)：使用全文索引时结果已按相关度排序，rank为相关度表达式（bm25，越小越相关），
+    供游标分页使用；回退为LIKE时只加过滤条件，rank为None，由调用方决定排序。
+    """
+    match = build_match_query(search)
+    if match and search_index_available(session):
+        rank = func.bm25(text('articles_fts'), *RANK_WEIGHTS)
+        query = query.join(articles_fts, articles_fts.c.rowid == model.id) \
+            .filter(articles_fts.c.articles_fts.match(match)) \
+            .order_by(rank)
+        return query, rank
+
+    for term in search_terms(search):
+        query = query.filter(or_(
+            model.title.contains(term),
+            model.summary.contains(term),
+            model.content.contains(term)
+        ))
+    return query, None
+
+
+def make_snippet(value: str, search: str, width: int = 120) -> Markup:
+    """从原文截取包含搜索词的片段，并用<mark>高亮搜索词"""
+    plain = ' '.join(plain_text(value).split())
+    terms = search_terms(search)
+    lowered = plain.lower()
+
+    positions = [pos for pos in (lowered.find(term.lower()) for term in terms) if pos >= 0]
+    start = max(0, min(positions) - width // 4) if positions else 0
+    fragment = plain[start:start + width]
+
+    if terms:
+        pattern = re.compile('|'.join(re.escape(term) for term in sorted(terms, key=len, reverse=True)), re.I)
+        pieces = []
+        cursor = 0
+        for found in pattern.finditer(fragment):
+            pieces.append(escape(fragment[cursor:found.start()]))
+            pieces.append(Markup('<mark>%s</mark>') % found.group(0))
+            cursor = found.end()
+        pieces.append(escape(fragment[cursor:]))
+        snippet = Markup('').join(pieces)
+    else:
+        snippet = escape(fragment)
+
+    if start > 0:
+        snippet = Markup('...') + snippet
+    if start + width < len(plain):
+        snippet += Markup('...')
+    return snippet
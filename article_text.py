@@ -0,0 +1,181 @@
+"""
+文章纯文本提取
+把Markdown/HTML正文转换为纯文本，字数统计、摘要、审核预过滤和全文索引共用同一次提取结果。
+提取结果按内容的BLAKE2b摘要缓存，同一次保存中各环节（包括全文索引触发器）只提取一次
+"""
+
+import hashlib
+import html
+import re
+import threading
+from collections import OrderedDict
+from typing import NamedTuple
+
+# 提取结果缓存的条数和总字符数上限
+MEMO_SIZE = 256
+MEMO_MAX_CHARS = 16 * 1024 * 1024
+# 短文本（标题、摘要、搜索词）直接提取，计算摘要和加锁的开销比提取本身还大
+MEMO_MIN_LENGTH = 256
+
+# 不显示的HTML内容：注释、脚本和样式
+_HTML_HIDDEN_RE = re.compile(r'<!--.*?-->|<(script|style)\b[^>]*>.*?</\1\s*>', re.S | re.I)
+# 块级标签换行，其余标签直接去掉（<b>微</b>信 仍是“微信”）
+_HTML_BLOCK_RE = re.compile(
+    r'</?(?:p|div|br|hr|li|ul|ol|h[1-6]|tr|td|th|table|thead|tbody|blockquote|pre|section|article|header|footer)\b[^>]*>',
+    re.I
+)
+_HTML_TAG_RE = re.compile(r'<[^>]*>')
+# Markdown：代码围栏行、分隔线、表格分隔行、引用式链接定义整行去掉
+_MD_LINE_DROP_RE = re.compile(
+    r'(?:```|~~~).*|(?:[-*_][ \t]*){3,}|\|?[ \t]*:?-+:?[ \t]*(?:\|[ \t]*:?-+:?[ \t]*)*\|?|\[[^\]]+\]:[ \t]*\S.*'
+)
+_MD_LINE_DROP_START = '`~-*_|:['
+# 链接保留链接文字（图片先把 ![ 换成 [，保留替代文字）
+_MD_LINK_RE = re.compile(r'\[([^\]\n]*)\]\([^)\n]*\)')
+# 行首的标题、引用、列表符号（可嵌套，如 “> - ”）
+_MD_LINE_PREFIX_RE = re.compile(r'(?:(?:#{1,6}|>|[-+*]|\d+[.)])(?:[ \t]+|$))+')
+_MD_LINE_PREFIX_START = '#>-+*0123456789'
+# 强调、删除线、行内代码和表格的标记符号；下划线只去掉词边界处的（保留 snake_case）
+_MD_INLINE_CHARS = '*~`|'
+_MD_UNDERSCORE_RE = re.compile(r'(?<![0-9A-Za-z])_+|_+(?![0-9A-Za-z])')
+
+
+class ExtractedText(NamedTuple):
+    """提取结果：text 为纯文本（每段一行，行内空白已合并），word_count 为不含空白的字符数"""
+    text: str
+    word_count: int
+
+    def summary(self, length: int = 200) -> str:
+        """取纯文本开头作为摘要，超长时截断并加省略号"""
+        if len(self.text) <= length:
+            return self.text.replace('\n', ' ')
+        return self.text[:length].replace('\n', ' ') + '...'
+
+
+def _extract(content: str) -> ExtractedText:
+    # 整段文本上只用C实现的字符串操作和带字面前缀的正则，逐行处理只看行首字符
+    text = content
+    if '<' in text:
+        text = _HTML_HIDDEN_RE.sub('', text)
+        text = _HTML_BLOCK_RE.sub('\n', text)
+        text = _HTML_TAG_RE.sub('', text)
+    if '](' in text:
+        text = _MD_LINK_RE.sub(r'\1', text.replace('![', '['))
+
+    lines = []
+    for line in text.split('\n'):
+        line = line.lstrip()
+        if not line:
+            continue
+        if line[0] in _MD_LINE_DROP_START and _MD_LINE_DROP_RE.fullmatch(line.rstrip()):
+            continue
+        if line[0] in _MD_LINE_PREFIX_START:
+            prefix = _MD_LINE_PREFIX_RE.match(line)
+            if prefix:
+                line = line[prefix.end():]
+        lines.append(line)
+    text = '\n'.join(lines)
+
+    for ch in _MD_INLINE_CHARS:
+        if ch in text:
+            text = text.replace(ch, '')
+    if '_' in text:
+        text = _MD_UNDERSCORE_RE.sub('', text)
+    # 实体在去掉标记之后再还原，&lt;b&gt; 这样的正文不会被当作标签
+    if '&' in text:
+        text = html.unescape(text)
+
+    lines = []
+    word_count = 0
+    for line in text.split('\n'):
+        words = line.split()
+        if words:
+            lines.append(' '.join(words))
+            word_count += sum(map(len, words))
+    return ExtractedText('\n'.join(lines), word_count)
+
+
+def content_key(content: str) -> bytes:
+    """内容的BLAKE2b摘要，用作提取结果缓存的键"""
+    return hashlib.blake2b(content.encode('utf-8', 'surrogatepass'), digest_size=16).digest()
+
+
+class ContentMemo:
+    """按内容摘要缓存派生文本的LRU，按条数和总字符数限额（不保留原文）"""
+
+    def __init__(self, max_entries: int = MEMO_SIZE, max_chars: int = MEMO_MAX_CHARS, size=len):
+        self.max_entries = max_entries
+        self.max_chars = max_chars
+        self._size = size
+        # key -> (value, chars)
+        self._entries = OrderedDict()
+        self._chars = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key, value):
+        chars = self._size(value)
+        if chars > self.max_chars:
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._chars -= old[1]
+            self._entries[key] = (value, chars)
+            self._chars += chars
+            while len(self._entries) > self.max_entries or self._chars > self.max_chars:
+                _, (_, evicted) = self._entries.popitem(last=False)
+                self._chars -= evicted
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._chars = 0
+            self.hits = 0
+            self.misses = 0
+
+
+_memo = ContentMemo(size=lambda extracted: len(extracted.text))
+
+
+def extract_text(content) -> ExtractedText:
+    """提取正文的纯文本和字数（按内容摘要缓存）"""
+    if not content:
+        return ExtractedText('', 0)
+    if len(content) < MEMO_MIN_LENGTH:
+        return _extract(content)
+    key = content_key(content)
+    result = _memo.get(key)
+    if result is None:
+        result = _extract(content)
+        _memo.put(key, result)
+    return result
+
+
+def plain_text(content) -> str:
+    """正文的纯文本"""
+    return extract_text(content).text
+
+
+def memo_stats() -> dict:
+    """提取结果缓存的命中情况"""
+    return {'hits': _memo.hits, 'misses': _memo.misses, 'entries': len(_memo)}
+
+
+def clear_memo():
+    """清空提取结果缓存"""
+    _memo.clear()
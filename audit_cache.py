@@ -0,0 +1,192 @@
+"""
+审核结果缓存
+内存LRU缓存（按条数和字节数限额，带TTL），可选SQLite持久化二级缓存
+"""
+
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+
+
+class AuditCache:
+    """带容量上限和过期时间的审核结果缓存
+
+    一级缓存在进程内存中，按LRU淘汰；配置了db_path时，审核结论还会写入
+    SQLite二级缓存，重启或重新部署后仍可复用，避免重复调用付费API。
+    """
+
+    # 每写入多少次清理一次过期条目
+    SWEEP_INTERVAL = 1000
+
+    def __init__(self, max_entries: int = 10000, max_bytes: int = 64 * 1024 * 1024,
+                 ttl: int = 3600, db_path: str = None, persist_ttl: int = None):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.persist_ttl = persist_ttl if persist_ttl is not None else ttl
+
+        # key -> (result, timestamp, size)
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._writes = 0
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.persistent_hits = 0
+
+        self._db = None
+        if db_path:
+            self._init_db(db_path)
+
+    def _init_db(self, db_path: str):
+        """初始化持久化缓存表"""
+        try:
+            self._db = sqlite3.connect(db_path, check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("""
+                CREATE TABLE IF NOT EXISTS audit_cache (
+                    cache_key TEXT PRIMARY KEY,
+                    result TEXT NOT NULL,
+                    created_at REAL NOT NULL
+                )
+            """)
+            self._db.commit()
+        except sqlite3.Error as e:
+            print(f"审核缓存持久化初始化失败，仅使用内存缓存: {e}")
+            self._db = None
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, key: str) -> bool:
+        with self._lock:
+            entry = self._entries.get(key)
+            return entry is not None and time.time() - entry[1] < self.ttl
+
+    def get(self, key: str) -> Optional[dict]:
+        """读取缓存，未命中或已过期时返回None"""
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if now - entry[1] < self.ttl:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return entry[0]
+                self._remove(key)
+                self.expirations += 1
+
+            result = self._load_persistent(key, now)
+            if result is not None:
+                self.hits += 1
+                self.persistent_hits += 1
+                self._store(key, result, now, self._estimate_size(result))
+                return result
+
+            self.misses += 1
+            return None
+
+    def set(self, key: str, result: dict):
+        """写入缓存"""
+        now = time.time()
+        payload = json.dumps(result, ensure_ascii=False)
+        with self._lock:
+            self._store(key, result, now, len(payload.encode('utf-8')))
+            self._save_persistent(key, payload, now)
+
+            self._writes += 1
+            if self._writes % self.SWEEP_INTERVAL == 0:
+                self._sweep_expired(now)
+
+    def clear(self):
+        """清空内存缓存（持久化缓存保留）"""
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self) -> dict:
+        """缓存统计信息"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'bytes': self._bytes,
+                'max_entries': self.max_entries,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+                'persistent': self._db is not None,
+                'persistent_hits': self.persistent_hits
+            }
+
+    @staticmethod
+    def _estimate_size(result: dict) -> int:
+        return len(json.dumps(result, ensure_ascii=False).encode('utf-8'))
+
+    def _store(self, key: str, result: dict, timestamp: float, size: int):
+        """写入内存缓存并按容量淘汰最久未使用的条目（调用方持有锁）"""
+        if key in self._entries:
+            self._remove(key)
+        if size > self.max_bytes:
+            return
+        self._entries[key] = (result, timestamp, size)
+        self._bytes += size
+
+        while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+            oldest_key = next(iter(self._entries))
+            self._remove(oldest_key)
+            self.evictions += 1
+
+    def _remove(self, key: str):
+        _, _, size = self._entries.pop(key)
+        self._bytes -= size
+
+    def _sweep_expired(self, now: float):
+        """清理过期条目（调用方持有锁）"""
+        expired = [key for key, (_, timestamp, _) in self._entries.items() if now - timestamp >= self.ttl]
+        for key in expired:
+            self._remove(key)
+        self.expirations += len(expired)
+
+        if self._db is not None:
+            try:
+                self._db.execute("DELETE FROM audit_cache WHERE created_at < ?", (now - self.persist_ttl,))
+                self._db.commit()
+            except sqlite3.Error as e:
+                print(f"清理持久化缓存失败: {e}")
+
+    def _load_persistent(self, key: str, now: float) -> Optional[dict]:
+        """从持久化缓存读取（调用方持有锁）"""
+        if self._db is None:
+            return None
+        try:
+            row = self._db.execute(
+                "SELECT result FROM audit_cache WHERE cache_key = ? AND created_at >= ?",
+                (key, now - self.persist_ttl)
+            ).fetchone()
+        except sqlite3.Error as e:
+            print(f"读取持久化缓存失败: {e}")
+            return None
+        return json.loads(row[0]) if row else None
+
+    def _save_persistent(self, key: str, payload: str, now: float):
+        """写入持久化缓存（调用方持有锁）"""
+        if self._db is None:
+            return
+        try:
+            self._db.execute(
+                "INSERT OR REPLACE INTO audit_cache (cache_key, result, created_at) VALUES (?, ?, ?)",
+                (key, payload, now)
+            )
+            self._db.commit()
+        except sqlite3.Error as e:
+            print(f"写入持久化缓存失败: {e}")
@@ -0,0 +1,135 @@
+"""
+异步审核任务
+文章先以 pending 状态保存，审核在后台线程池中完成后再写回文章和审核日志
+"""
+
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+from models import db, Article, AuditLog
+from deepseek_audit import content_fingerprint
+
+
+class AuditJobRunner:
+    """后台审核任务执行器"""
+
+    def __init__(self, app, audit_service, max_workers: int = 4, stale_after: float = 120):
+        self.app = app
+        self.audit_service = audit_service
+        # pending 超过该秒数且不在本进程队列中的文章视为任务已丢失
+        self.stale_after = stale_after
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='audit-job')
+        self._lock = threading.Lock()
+        # article_id -> 最新一次提交的任务序号，旧任务完成时不覆盖新结果
+        self._latest = {}
+        self._sequence = 0
+
+        self.submitted = 0
+        self.completed = 0
+        self.failed = 0
+        self.superseded = 0
+        self.recovered = 0
+
+    def submit(self, article_id: int, user_id: int, content: str, strict_level: int, plain: str = None):
+        """提交审核任务，返回Future（plain 为保存时已提取的纯文本，预过滤直接使用）"""
+        with self._lock:
+            self._sequence += 1
+            sequence = self._sequence
+            self._latest[article_id] = sequence
+            self.submitted += 1
+        return self._executor.submit(self._run, sequence, article_id, user_id, content, strict_level, plain)
+
+    def supersede(self, article_id: int):
+        """同步保存了新的审核结果，使该文章尚未完成的后台任务失效"""
+        with self._lock:
+            if article_id in self._latest:
+                self._sequence += 1
+                self._latest[article_id] = self._sequence
+
+    def _is_latest(self, article_id: int, sequence: int) -> bool:
+        with self._lock:
+            return self._latest.get(article_id) == sequence
+
+    def _finish(self, article_id: int, sequence: int):
+        with self._lock:
+            if self._latest.get(article_id) == sequence:
+                del self._latest[article_id]
+
+    def _run(self, sequence: int, article_id: int, user_id: int, content: str, strict_level: int,
+             plain: str = None):
+        """执行审核并写回结果（与同步保存路径写入相同的字段和日志）"""
+        with self.app.app_context():
+            try:
+                audit_result = self.audit_service.audit_content(content, strict_level, mode='background', plain=plain)
+
+                if not self._is_latest(article_id, sequence):
+                    # 审核期间文章又被保存，交给新任务写入
+                    self.superseded += 1
+                    return None
+
+                article = db.session.get(Article, article_id)
+                if not article:
+                    return None
+
+                fingerprint = None if audit_result.get('fallback') else content_fingerprint(content)
+                article.apply_audit_result(audit_result, fingerprint, strict_level)
+                db.session.add(AuditLog.from_audit_result(article, user_id, audit_result, strict_level))
+                db.session.commit()
+                self.completed += 1
+                return audit_result
+
+            except Exception as e:
+                print(f"后台审核任务失败: article_id={article_id}, {e}")
+                db.session.rollback()
+                self.failed += 1
+                if self._is_latest(article_id, sequence):
+                    article = db.session.get(Article, article_id)
+                    if article:
+                        article.audit_status = 'failed'
+                        db.session.commit()
+                return None
+
+            finally:
+                self._finish(article_id, sequence)
+
+    def recover_stale(self, article_id: int = None) -> int:
+        """把任务已丢失的待审核文章标记为审核失败，返回标记的篇数
+
+        任务队列只在内存中，进程重启或部署时排队的任务会丢失，文章一直停在 pending。
+        pending 超过 stale_after 秒且不在本进程队列中的文章标记为 failed，下次保存时重新审核；
+        其他进程的任务若之后完成，仍会写入审核结果。需在应用上下文中调用，article_id 为空时检查全部文章。
+        """
+        cutoff = datetime.utcnow() - timedelta(seconds=self.stale_after)
+        query = Article.query.filter(Article.audit_status == 'pending', Article.updated_at < cutoff)
+        if article_id is not None:
+            query = query.filter(Article.id == article_id)
+        with self._lock:
+            queued = set(self._latest)
+        stale = [article_id for (article_id,) in query.with_entities(Article.id) if article_id not in queued]
+        if not stale:
+            return 0
+        # 保留 updated_at，标记失败不改变文章在列表中的顺序；仍为 pending 才标记，不覆盖刚写入的结果
+        count = Article.query.filter(Article.id.in_(stale), Article.audit_status == 'pending') \
+            .update({Article.audit_status: 'failed', Article.updated_at: Article.updated_at},
+                    synchronize_session='fetch')
+        db.session.commit()
+        with self._lock:
+            self.recovered += count
+        print(f"待审核任务已丢失，标记为审核失败: {stale}")
+        return count
+
+    def stats(self) -> dict:
+        """任务统计"""
+        with self._lock:
+            return {
+                'submitted': self.submitted,
+                'completed': self.completed,
+                'failed': self.failed,
+                'superseded': self.superseded,
+                'recovered': self.recovered,
+                'pending': len(self._latest)
+            }
+
+    def shutdown(self, wait: bool = True):
+        self._executor.shutdown(wait=wait)
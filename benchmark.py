@@ -0,0 +1,294 @@
+#!/usr/bin/env python3
+"""
+性能基准脚本
+用于评估审核、存储等热点路径的吞吐量
+"""
+
+import random
+import sys
+import time
+
+def _random_cjk(rng, length):
+    """生成指定长度的随机中文字符串"""
+    return ''.join(chr(rng.randint(0x4e00, 0x9fa5)) for _ in range(length))
+
+def _build_article(rng, size, patterns, hit_count=200):
+    """生成约size字符的文章，并随机插入hit_count个关键词"""
+    chunks = []
+    total = 0
+    while total < size:
+        chunk = _random_cjk(rng, rng.randint(20, 80))
+        if hit_count and rng.random() < 0.3:
+            chunk += rng.choice(patterns)
+            hit_count -= 1
+        chunks.append(chunk)
+        total += len(chunk)
+    return ''.join(chunks)[:size]
+
+def bench_matcher(pattern_count=50000, article_size=100 * 1024, rounds=3):
+    """关键词匹配：逐词 in 扫描 vs Aho-Corasick自动机"""
+    from keyword_matcher import KeywordMatcher
+
+    rng = random.Random(42)
+    patterns = list({_random_cjk(rng, rng.randint(2, 6)) for _ in range(pattern_count)})
+    article = _build_article(rng, article_size, patterns)
+    size_mb = len(article.encode('utf-8')) / 1024 / 1024
+
+    print(f"📐 词库: {len(patterns)} 个关键词, 文章: {len(article)} 字符 ({size_mb:.2f} MB UTF-8)")
+
+    start = time.perf_counter()
+    matcher = KeywordMatcher(patterns)
+    build_time = time.perf_counter() - start
+    print(f"自动机编译: {build_time:.2f}s (每个词库版本只需一次)")
+
+    start = time.perf_counter()
+    for _ in range(rounds):
+        article_lower = article.lower()
+        naive_found = [word for word in patterns if word in article_lower]
+    naive_time = (time.perf_counter() - start) / rounds
+
+    start = time.perf_counter()
+    for _ in range(rounds):
+        ac_found = matcher.find_words(article)
+    ac_time = (time.perf_counter() - start) / rounds
+
+    assert set(naive_found) == set(ac_found), "两种匹配方式结果不一致"
+
+    print(f"逐词扫描:   {naive_time * 1000:8.1f} ms/篇  {size_mb / naive_time:8.2f} MB/s")
+    print(f"自动机匹配: {ac_time * 1000:8.1f} ms/篇  {size_mb / ac_time:8.2f} MB/s")
+    print(f"命中关键词: {len(ac_found)} 个, 加速比: {naive_time / ac_time:.1f}x")
+
+def _editor_variants(rng, markdown_text):
+    """模拟编辑器对同一篇文章的多次提交：原文、末尾换行、空白调整、Markdown转HTML、全角字符"""
+    import markdown
+
+    return [
+        markdown_text,
+        markdown_text + '\n',
+        markdown_text.replace('\n', '\r\n'),
+        markdown_text.replace('\n\n', '\n\n\n').replace('，', '， '),
+        markdown.markdown(markdown_text),
+        markdown_text.replace(',', '，').replace('1', '１'),
+    ]
+
+def bench_cache_keys(article_count=200, article_size=4000, rounds=20):
+    """审核缓存键：原始MD5 vs 规范化+SHA-256 的命中率与耗时
+
+    提交流量是合成的：随机中文段落加上 _editor_variants 模拟的格式变体，
+    不是真实编辑器的提交记录，命中率只说明规范化能合并哪些差异。
+    """
+    import hashlib
+    from deepseek_audit import DeepSeekAudit
+
+    rng = random.Random(7)
+    audit = DeepSeekAudit('')
+
+    # 按编辑器提交顺序回放：每篇文章的若干格式变体穿插提交
+    traffic = []
+    for i in range(article_count):
+        paragraphs = [f"## 第{i}篇 小节{j}\n\n" + _random_cjk(rng, rng.randint(100, 400)) + f"，见[链接](http://example.com/{j})"
+                      for j in range(article_size // 300)]
+        traffic.extend(rng.sample(_editor_variants(rng, '\n\n'.join(paragraphs)), k=4))
+    print(f"📐 回放 {len(traffic)} 次合成提交（{article_count} 篇随机文章的格式变体，非真实编辑器流量）")
+
+    schemes = {
+        '原始MD5': lambda content: hashlib.md5(f"{content}:2".encode()).hexdigest(),
+        '规范化+SHA-256': lambda content: audit._get_cache_key(content, 2),
+    }
+    for name, key_func in schemes.items():
+        seen = set()
+        hits = 0
+        for content in traffic:
+            key = key_func(content)
+            hits += key in seen
+            seen.add(key)
+        print(f"{name:<14} 命中率: {hits / len(traffic):6.1%}  不同键: {len(seen)}")
+
+    large = _random_cjk(rng, 100 * 1024)
+    for name, key_func in schemes.items():
+        start = time.perf_counter()
+        for _ in range(rounds):
+            key_func(large)
+        elapsed = (time.perf_counter() - start) / rounds
+        print(f"{name:<14} 100KB文章生成键: {elapsed * 1000:6.2f} ms")
+
+def bench_sanitize(article_size=100 * 1024, word_count=500, rounds=3):
+    """敏感词净化：逐词 str.replace vs 单次扫描掩码"""
+    from deepseek_audit import DeepSeekAudit
+
+    rng = random.Random(11)
+    words = list({_random_cjk(rng, rng.randint(2, 4)) for _ in range(word_count)})
+    article = _build_article(rng, article_size, words, hit_count=2000)
+    audit = DeepSeekAudit('')
+    print(f"📐 文章: {len(article)} 字符, 违规词: {len(words)} 个")
+
+    def replace_loop(content, flagged_words):
+        for word in flagged_words:
+            content = content.replace(word, '*' * len(word))
+        return content
+
+    for name, func in (('逐词replace', replace_loop), ('单次扫描掩码', audit._sanitize_content)):
+        start = time.perf_counter()
+        for _ in range(rounds):
+            func(article, words)
+        elapsed = (time.perf_counter() - start) / rounds
+        print(f"{name:<10} {elapsed * 1000:8.1f} ms/篇")
+
+def _edit(rng, content):
+    """模拟一次编辑：改写、插入或删除一个句子"""
+    sentences = content.split('。')
+    i = rng.randrange(len(sentences))
+    action = rng.random()
+    if action < 0.5:
+        sentences[i] = _random_cjk(rng, rng.randint(10, 60))
+    elif action < 0.8:
+        sentences.insert(i, _random_cjk(rng, rng.randint(10, 60)))
+    elif len(sentences) > 1:
+        del sentences[i]
+    return '。'.join(sentences)
+
+def bench_revisions(article_size=20 * 1024, saves=200):
+    """修订存储：每次保存完整副本 vs 快照+差异+压缩 的存储量与读写耗时"""
+    from flask import Flask
+    from models import db, User, Article, ArticleRevision
+    from article_revisions import record_revision, load_revision
+
+    rng = random.Random(5)
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///:memory:'
+    db.init_app(app)
+
+    with app.app_context():
+        db.create_all()
+        user = User(username='bench', password_hash='-')
+        db.session.add(user)
+        db.session.flush()
+        paragraphs = ['。'.join(_random_cjk(rng, rng.randint(10, 60)) for _ in range(8)) + '。\n\n'
+                      for _ in range(article_size // 280)]
+        article = Article(title='基准', content=''.join(paragraphs), user_id=user.id)
+        db.session.add(article)
+        db.session.flush()
+
+        full_bytes = 0
+        start = time.perf_counter()
+        for _ in range(saves):
+            article.content = _edit(rng, article.content)
+            full_bytes += len(article.content.encode('utf-8'))
+            record_revision(article, user.id)
+            db.session.flush()
+        record_time = (time.perf_counter() - start) / saves
+        db.session.commit()
+
+        stored = db.session.query(db.func.sum(db.func.length(ArticleRevision.data))).scalar()
+        snapshots = ArticleRevision.query.filter_by(kind='snapshot').count()
+        print(f"📐 文章: {len(article.content)} 字符, 保存 {saves} 次, 其中快照 {snapshots} 个")
+        print(f"完整副本:        {full_bytes / 1024:9.1f} KB")
+        print(f"快照+差异+压缩:  {stored / 1024:9.1f} KB  ({stored / full_bytes:.1%})")
+
+        start = time.perf_counter()
+        for revision in range(1, saves + 1):
+            load_revision(article.id, revision)
+        load_time = (time.perf_counter() - start) / saves
+        print(f"记录修订: {record_time * 1000:6.2f} ms/次  还原修订: {load_time * 1000:6.2f} ms/次")
+
+def _markdown_article(rng, size):
+    """生成约size字符的Markdown/HTML混排文章：标题、列表、链接、图片、强调、代码块和内嵌HTML"""
+    blocks = []
+    total = 0
+    i = 0
+    while total < size:
+        kind = i % 6
+        text = _random_cjk(rng, rng.randint(40, 160))
+        if kind == 0:
+            block = f"## 第{i}节 {text[:12]}"
+        elif kind == 1:
+            block = '\n'.join(f"- **{_random_cjk(rng, 6)}** {_random_cjk(rng, 20)}" for _ in range(4))
+        elif kind == 2:
+            block = f"{text}，参见[{text[:6]}](https://example.com/docs/{i}?ref=list)和![配图](/static/img/{i}.png)"
+        elif kind == 3:
+            block = f"```python\nprint('{text[:10]}')\n```"
+        elif kind == 4:
+            block = f"<p>{text[:30]}<b>{text[30:40]}</b>{text[40:]}&nbsp;</p>"
+        else:
+            block = f"> {text}"
+        blocks.append(block)
+        total += len(block) + 2
+        i += 1
+    return '\n\n'.join(blocks)
+
+def bench_text_extract(sizes=(10 * 1024, 100 * 1024, 1024 * 1024), saves=5):
+    """保存文章的文本处理：各环节分别清洗原文 vs 单次提取+按内容摘要缓存
+
+    回放对同一篇文章的连续编辑保存，每次保存包括字数、摘要、审核预过滤（标题+正文，
+    单次提取时原文和纯文本各匹配一次）和全文索引更新触发器（删除旧正文的索引词、写入新正文的索引词）。
+    """
+    import re
+    from article_search import _CJK_RUN_RE, _bigrams, cjk_tokens
+    from article_text import extract_text, clear_memo, memo_stats
+    from keyword_matcher import KeywordMatcher
+    from deepseek_audit import QUICK_BLACKLIST
+
+    rng = random.Random(13)
+    matcher = KeywordMatcher(QUICK_BLACKLIST)
+    title = '基准文章'
+
+    def separate(old, content):
+        # 原实现：字数、摘要各清洗一次，预过滤匹配原文，触发器对新旧正文各去一次标签
+        clean = re.sub(r'[#*`\[\]()_~]', '', re.sub(r'<[^>]+>', '', content))
+        len(clean.replace(' ', '').replace('\n', ''))
+        clean = re.sub(r'[#*`\[\]()_~]', '', re.sub(r'<[^>]+>', '', content)).strip()
+        clean[:200]
+        matcher.find_all(f"{title} {content}")
+        for value in (old, content):
+            _CJK_RUN_RE.sub(_bigrams, re.sub(r'<[^>]+>', ' ', value))
+
+    def shared(old, content):
+        # 与保存接口一致：正文提取一次，预过滤匹配原文和 标题 + 正文纯文本
+        extracted = extract_text(content)
+        extracted.word_count
+        extracted.summary()
+        matcher.find_all(f"{title} {content}")
+        matcher.find_all(f"{title} {extracted.text}")
+        cjk_tokens(old)
+        cjk_tokens(content)
+
+    for size in sizes:
+        versions = [_markdown_article(rng, size)]
+        for _ in range(saves):
+            versions.append(versions[-1] + '\n\n' + _random_cjk(rng, 100))
+        size_mb = len(versions[0].encode('utf-8')) / 1024 / 1024
+        print(f"📐 文章: {len(versions[0])} 字符 ({size_mb:.2f} MB UTF-8), 连续保存 {saves} 次")
+
+        for name, func in (('分别清洗', separate), ('单次提取', shared)):
+            clear_memo()
+            # 第一个版本视为之前已保存过（进程内已有它的提取结果和索引词）
+            cjk_tokens(versions[0])
+            start = time.perf_counter()
+            for old, content in zip(versions, versions[1:]):
+                func(old, content)
+            elapsed = (time.perf_counter() - start) / saves
+            print(f"  {name}: {elapsed * 1000:8.1f} ms/次保存")
+        stats = memo_stats()
+        print(f"  提取缓存: 命中 {stats['hits']} 次, 提取 {stats['misses']} 次")
+
+        start = time.perf_counter()
+        extract_text(versions[-1])
+        print(f"  缓存命中: {(time.perf_counter() - start) * 1000:8.2f} ms（只计算内容摘要）")
+
+BENCHMARKS = {
+    'matcher': bench_matcher,
+    'cache_keys': bench_cache_keys,
+    'sanitize': bench_sanitize,
+    'revisions': bench_revisions,
+    'text_extract': bench_text_extract,
+}
+
+if __name__ == '__main__':
+    names = sys.argv[1:] or list(BENCHMARKS)
+    for name in names:
+        if name not in BENCHMARKS:
+            print(f"用法: python benchmark.py [{'|'.join(BENCHMARKS)}]")
+            sys.exit(1)
+        print(f"\n⏱️  {name}")
+        print("=" * 40)
+        BENCHMARKS[name]()
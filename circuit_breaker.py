@@ -0,0 +1,129 @@
+"""
+熔断器
+DeepSeek接口连续失败或延迟过高时暂停调用，直接走本地降级审核，
+冷却后以少量半开探测请求检查接口是否恢复
+"""
+
+import threading
+import time
+from collections import deque
+
+
+class CircuitOpenError(Exception):
+    """熔断器打开时拒绝调用"""
+
+
+class CircuitBreaker:
+    """基于连续失败次数和P95延迟的熔断器
+
+    状态：closed（正常）-> open（熔断）-> half_open（探测）-> closed / open
+    """
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, failure_threshold: int = 5, latency_threshold: float = None,
+                 recovery_timeout: float = 30, half_open_requests: int = 1,
+                 window_size: int = 50, min_samples: int = 10):
+        self.failure_threshold = failure_threshold
+        self.latency_threshold = latency_threshold
+        self.recovery_timeout = recovery_timeout
+        self.half_open_requests = half_open_requests
+        self.min_samples = min_samples
+
+        self._state = self.CLOSED
+        self._lock = threading.Lock()
+        self._latencies = deque(maxlen=window_size)
+        self._consecutive_failures = 0
+        self._opened_at = 0.0
+        self._probes_in_flight = 0
+
+        self.trips = 0
+        self.rejected = 0
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            self._refresh_state()
+            return self._state
+
+    def _refresh_state(self):
+        """冷却时间已过则进入半开状态（调用方持有锁）"""
+        if self._state == self.OPEN and time.time() - self._opened_at >= self.recovery_timeout:
+            self._state = self.HALF_OPEN
+            self._probes_in_flight = 0
+
+    def _trip(self):
+        """打开熔断器（调用方持有锁）"""
+        self._state = self.OPEN
+        self._opened_at = time.time()
+        self._probes_in_flight = 0
+        self.trips += 1
+
+    def _p95(self):
+        """最近窗口内的P95延迟，样本不足时返回None（调用方持有锁）"""
+        if len(self._latencies) < self.min_samples:
+            return None
+        ordered = sorted(self._latencies)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
+
+    def allow_request(self) -> bool:
+        """是否允许本次调用；半开状态下只放行有限的探测请求"""
+        with self._lock:
+            self._refresh_state()
+            if self._state == self.CLOSED:
+                return True
+            if self._state == self.HALF_OPEN and self._probes_in_flight < self.half_open_requests:
+                self._probes_in_flight += 1
+                return True
+            self.rejected += 1
+            return False
+
+    def record_success(self, latency: float):
+        """记录一次成功调用及其耗时"""
+        with self._lock:
+            self._consecutive_failures = 0
+            if self._state == self.HALF_OPEN:
+                # 探测成功，恢复正常并丢弃熔断前的延迟样本
+                self._state = self.CLOSED
+                self._latencies.clear()
+                self._latencies.append(latency)
+                return
+
+            self._latencies.append(latency)
+            p95 = self._p95()
+            if self.latency_threshold and p95 is not None and p95 > self.latency_threshold:
+                print(f"DeepSeek接口P95延迟 {p95:.1f}s 超过阈值，熔断器打开")
+                self._latencies.clear()
+                self._trip()
+
+    def record_failure(self):
+        """记录一次失败调用"""
+        with self._lock:
+            self._consecutive_failures += 1
+            if self._state == self.HALF_OPEN:
+                print("DeepSeek接口探测失败，熔断器保持打开")
+                self._trip()
+            elif self._state == self.CLOSED and self._consecutive_failures >= self.failure_threshold:
+                print(f"DeepSeek接口连续失败 {self._consecutive_failures} 次，熔断器打开")
+                self._trip()
+
+    def p95_latency(self):
+        """最近调用的P95延迟（秒），样本不足时返回None"""
+        with self._lock:
+            return self._p95()
+
+    def stats(self) -> dict:
+        """熔断器状态统计"""
+        with self._lock:
+            self._refresh_state()
+            p95 = self._p95()
+            return {
+                'state': self._state,
+                'consecutive_failures': self._consecutive_failures,
+                'p95_latency': round(p95, 3) if p95 is not None else None,
+                'samples': len(self._latencies),
+                'trips': self.trips,
+                'rejected': self.rejected
+            }
@@ -1,10 +1,66 @@
 import os
+import re
 import json
+import zlib
 import hashlib
 import asyncio
 from typing import List, Dict, Optional
 import requests
 import time
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from functools import lru_cache
+from keyword_matcher import KeywordMatcher, mask_spans
+from audit_cache import AuditCache
+from article_text import plain_text
+from circuit_breaker import CircuitBreaker, CircuitOpenError
+from config import DEEPSEEK_CONFIG
+
+# 快速预过滤黑名单
+QUICK_BLACKLIST = [
+    # 联系方式
+    "微信", "qq", "手机号", "电话", "加我", "v信", "vx",
+    # 明显广告
+    "加好友", "添加", "私聊", "代理", "招商",
+    # 极端言论
+    "死去", "杀死", "砍死", "操你",
+    # 政治敏感
+    "习近平", "毛泽东", "邓小平", "江泽民", "胡锦涛",
+    # 色情低俗
+    "做爱", "性交", "裸体", "色情"
+]
+
+# 基础敏感词库（API不可用时使用）
+BASIC_SENSITIVE_WORDS = [
+    "敏感词", "违规内容", "不当言论", "政治", "暴力",
+    "色情", "赌博", "毒品", "诈骗", "人身攻击"
+]
+
+def content_fingerprint(content: str) -> str:
+    """内容指纹：规范化后内容的摘要，只有空白和大小写差异的内容指纹相同"""
+    return _key_hash(normalize_for_key(content)).hexdigest()[:32]
+
+def normalize_for_key(content: str) -> bytes:
+    """规范化内容用于生成缓存键，返回UTF-8字节
+    
+    只合并空白（连续空白、换行、CRLF、首尾空白视为一个空格）并把英文字母转为小写，
+    与关键词匹配（忽略大小写）的判断一致。链接地址、HTML标签及其属性、全角字符和
+    中文旁的空格都保留："微 信" 与 "微信"、只改了链接地址的两篇文章审核结论可能不同，
+    不能共用缓存键。
+    
+    直接在编码后的字节上切分和转小写（ASCII空白和字母），比在字符串上处理少一半以上的耗时；
+    全角空格等非ASCII空白和非英文字母的大小写不合并，只会少命中缓存，不会误命中。
+    """
+    return b' '.join(content.encode('utf-8').split()).lower()
+
+def _key_hash(data: bytes):
+    # 缓存键不用于安全场景，取SHA-256的前16字节：大多数CPU有SHA指令，比BLAKE2b和MD5都快
+    return hashlib.sha256(data)
+
+@lru_cache(maxsize=256)
+def _compile_flagged_words(words: tuple) -> KeywordMatcher:
+    """编译违规关键词集合（DeepSeek返回的关键词组合重复率高，缓存编译结果）"""
+    return KeywordMatcher(words)
 
 class DeepSeekAudit:
     def __init__(self, api_key: str = None):
@@ -17,22 +73,118 @@ class DeepSeekAudit:
                 from openai import OpenAI
                 self.client = OpenAI(
                     api_key=self.api_key,
-                    base_url="https://api.deepseek.com"
+                    base_url="https://api.deepseek.com",
+                    timeout=DEEPSEEK_CONFIG.get('background_timeout', 120),
+                    max_retries=DEEPSEEK_CONFIG.get('max_retries', 1)
                 )
             except Exception as e:
                 print(f"DeepSeek客户端初始化失败: {e}")
                 self.client = None
         
-        self.cache = {}
-        self.cache_expire = 3600  # 1小时缓存
+        self.cache_expire = DEEPSEEK_CONFIG.get('cache_expire', 3600)
+        self.cache = AuditCache(
+            max_entries=DEEPSEEK_CONFIG.get('cache_max_entries', 10000),
+            max_bytes=DEEPSEEK_CONFIG.get('cache_max_bytes', 64 * 1024 * 1024),
+            ttl=self.cache_expire,
+            db_path=DEEPSEEK_CONFIG.get('cache_db_path') or None,
+            persist_ttl=DEEPSEEK_CONFIG.get('cache_persist_expire')
+        )
+        
+        # 词库及其编译后的匹配器，词库变更时才重新编译
+        self.word_lists = {
+            'quick': list(QUICK_BLACKLIST),
+            'basic': list(BASIC_SENSITIVE_WORDS)
+        }
+        self._matchers = {}
+        
+        # 进行中的审核请求：相同缓存键的并发调用共享同一个结果
+        self._inflight = {}
+        self._inflight_lock = threading.Lock()
+        self.inflight_started = 0
+        self.inflight_coalesced = 0
+        
+        # 熔断器：接口持续失败或变慢时直接走本地降级审核
+        self.breaker = CircuitBreaker(
+            failure_threshold=DEEPSEEK_CONFIG.get('breaker_failure_threshold', 5),
+            latency_threshold=DEEPSEEK_CONFIG.get('breaker_latency_threshold'),
+            recovery_timeout=DEEPSEEK_CONFIG.get('breaker_recovery_timeout', 30),
+            half_open_requests=DEEPSEEK_CONFIG.get('breaker_half_open_requests', 1)
+        )
+        
+    def update_word_list(self, name: str, words: List[str]):
+        """替换词库，下次匹配时重新编译自动机"""
+        self.word_lists[name] = list(words)
+        self._matchers.pop(name, None)
+    
+    def _get_matcher(self, name: str) -> KeywordMatcher:
+        """获取词库对应的匹配器（按需编译）"""
+        matcher = self._matchers.get(name)
+        if matcher is None:
+            matcher = KeywordMatcher(self.word_lists.get(name, []))
+            self._matchers[name] = matcher
+        return matcher
         
     def _get_cache_key(self, content: str, strict_level: int) -> str:
-        """生成缓存键"""
-        return hashlib.md5(f"{content}:{strict_level}".encode()).hexdigest()
+        """生成缓存键（基于规范化后的内容）"""
+        digest = _key_hash(normalize_for_key(content))
+        digest.update(b'\x00%d' % strict_level)
+        return digest.hexdigest()[:32]
+    
+    @staticmethod
+    def _content_digest(content: str) -> str:
+        """原始内容摘要，用于判断缓存结果是否来自同一份原文"""
+        return _key_hash(content.encode('utf-8')).hexdigest()[:32]
+    
+    def _cache_get(self, cache_key: str, content: str) -> Optional[dict]:
+        """读取缓存并适配到当前内容"""
+        entry = self.cache.get(cache_key)
+        return self._adapt_result(entry, content) if entry is not None else None
+    
+    def _cache_set(self, cache_key: str, content: str, result: dict) -> dict:
+        """写入缓存，记录结果对应的原文摘要"""
+        entry = {'result': result, 'source': self._content_digest(content)}
+        self.cache.set(cache_key, entry)
+        return entry
     
-    def _is_cache_valid(self, cache_data: dict) -> bool:
-        """检查缓存是否有效"""
-        return time.time() - cache_data.get('timestamp', 0) < self.cache_expire
+    def _adapt_result(self, entry: dict, content: str) -> dict:
+        """缓存键相同但原文不同（仅格式差异）时，按当前原文重新生成净化内容"""
+        result = entry['result']
+        if 'sanitized_content' not in result or entry.get('source') == self._content_digest(content):
+            return result
+        adapted = dict(result)
+        adapted['sanitized_content'] = self._sanitize_content(content, result.get('flagged_keywords') or [])
+        return adapted
+    
+    def get_stats(self) -> dict:
+        """审核服务运行统计"""
+        with self._inflight_lock:
+            singleflight = {
+                'in_flight': len(self._inflight),
+                'started': self.inflight_started,
+                'coalesced': self.inflight_coalesced
+            }
+        return {
+            'cache': self.cache.stats(),
+            'singleflight': singleflight,
+            'breaker': self.breaker.stats()
+        }
+    
+    def _resolve_timeout(self, timeout: float, mode: str) -> float:
+        """根据调用场景确定本次审核的超时时间
+        
+        interactive（编辑器交互）预算较短，并参考最近的P95延迟进一步收紧；
+        background（后台重审）预算较长。
+        """
+        if timeout:
+            return timeout
+        if mode == 'background':
+            return DEEPSEEK_CONFIG.get('background_timeout', 120)
+        
+        timeout = DEEPSEEK_CONFIG.get('interactive_timeout', 10)
+        p95 = self.breaker.p95_latency()
+        if p95 is not None:
+            timeout = min(timeout, max(DEEPSEEK_CONFIG.get('min_timeout', 3), p95 * 3))
+        return timeout
     
     def _get_audit_prompt(self, content: str, strict_level: int) -> str:
         """构建审核提示词"""
@@ -65,39 +217,81 @@ class DeepSeekAudit:
     "sanitized_content": "净化后的内容（敏感词替换为*）"
 }}"""
 
-    def _quick_prefilter(self, content: str) -> tuple[bool, list]:
-        """快速本地预过滤"""
-        quick_blacklist = [
-            # 联系方式
-            "微信", "qq", "手机号", "电话", "加我", "v信", "vx",
-            # 明显广告
-            "加好友", "添加", "私聊", "代理", "招商",
-            # 极端言论
-            "死去", "杀死", "砍死", "操你",
-            # 政治敏感
-            "习近平", "毛泽东", "邓小平", "江泽民", "胡锦涛",
-            # 色情低俗
-            "做爱", "性交", "裸体", "色情"
-        ]
-        
-        content_lower = content.lower()
-        found_words = []
-        
-        for word in quick_blacklist:
-            if word in content_lower:
-                found_words.append(word)
-        
-        return len(found_words) == 0, found_words
-
-    def audit_content(self, content: str, strict_level: int = 2) -> dict:
-        """审核内容"""
+    def _quick_prefilter(self, content: str, plain: str = None) -> tuple[bool, list]:
+        """快速本地预过滤
+        
+        原文和提取出的纯文本都匹配：原文覆盖链接地址、图片路径、HTML属性、注释和脚本中的词，
+        纯文本能发现被标签拆开的词（如 <b>微</b>信）。
+        plain: 调用方已提取的纯文本，为空时在这里提取
+        """
+        matcher = self._get_matcher('quick')
+        matches = matcher.find_all(content)
+        if plain is None:
+            plain = plain_text(content)
+        if plain != content:
+            matches = matches + matcher.find_all(plain)
+        return not matches, matcher.words_in(matches)
+    
+    def _match_word_list(self, name: str, content: str) -> tuple:
+        """用指定词库匹配内容，返回 (是否通过, 命中词, 命中区间)"""
+        matcher = self._get_matcher(name)
+        matches = matcher.find_all(content)
+        return not matches, matcher.words_in(matches), matches
+
+    def audit_content(self, content: str, strict_level: int = 2, timeout: float = None,
+                      mode: str = 'interactive', plain: str = None) -> dict:
+        """审核内容
+        
+        timeout: 单次API调用的超时时间（秒），为空时按mode取默认值
+        mode: interactive（编辑器交互，短超时）或 background（后台审核，长超时）
+        plain: 调用方已提取的纯文本（如保存文章时的 标题 + 正文纯文本），预过滤直接使用
+        """
+        timeout = self._resolve_timeout(timeout, mode)
+        
         # 检查缓存
         cache_key = self._get_cache_key(content, strict_level)
-        if cache_key in self.cache and self._is_cache_valid(self.cache[cache_key]):
-            return self.cache[cache_key]['result']
+        cached_result = self._cache_get(cache_key, content)
+        if cached_result is not None:
+            return cached_result
         
+        # 相同内容已有请求在审核时，等待其结果而不是重复调用API
+        with self._inflight_lock:
+            future = self._inflight.get(cache_key)
+            is_leader = future is None
+            if is_leader:
+                future = Future()
+                self._inflight[cache_key] = future
+                self.inflight_started += 1
+            else:
+                self.inflight_coalesced += 1
+        
+        if not is_leader:
+            try:
+                return self._adapt_result(future.result(timeout=timeout), content)
+            except FutureTimeoutError:
+                print("等待进行中的审核超时，使用基础审核模式")
+                return self._basic_audit(content, strict_level)
+        
+        try:
+            # 上一个请求可能刚好在检查缓存之后写入了结果
+            entry = self.cache.get(cache_key) if cache_key in self.cache else None
+            if entry is None:
+                result = self._audit_uncached(content, strict_level, cache_key, timeout, plain, mode)
+                entry = {'result': result, 'source': self._content_digest(content)}
+            future.set_result(entry)
+            return self._adapt_result(entry, content)
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._inflight_lock:
+                self._inflight.pop(cache_key, None)
+    
+    def _audit_uncached(self, content: str, strict_level: int, cache_key: str, timeout: float = None,
+                        plain: str = None, mode: str = 'interactive') -> dict:
+        """未命中缓存时的审核流程：预过滤、API审核、降级"""
         # 快速预过滤
-        passed_prefilter, flagged_words = self._quick_prefilter(content)
+        passed_prefilter, flagged_words = self._quick_prefilter(content, plain)
         if not passed_prefilter:
             result = {
                 "passed": False,
@@ -106,13 +300,11 @@ class DeepSeekAudit:
                 "suggestions": ["请修改违规内容后重新提交"],
                 "flagged_keywords": flagged_words,
                 "risk_level": "high",
+                # 命中区间对应纯文本，净化时按命中词在原文中查找
                 "sanitized_content": self._sanitize_content(content, flagged_words)
             }
             # 缓存结果
-            self.cache[cache_key] = {
-                'result': result,
-                'timestamp': time.time()
-            }
+            self._cache_set(cache_key, content, result)
             return result
         
         # DeepSeek API审核
@@ -122,37 +314,14 @@ class DeepSeekAudit:
             return self._basic_audit(content, strict_level)
         
         try:
-            prompt = self._get_audit_prompt(content, strict_level)
-            
-            response = self.client.chat.completions.create(
-                model="deepseek-chat",
-                messages=[
-                    {"role": "system", "content": "你是一个严格的内容审核助手，必须输出纯JSON格式，不要任何额外文本。"},
-                    {"role": "user", "content": prompt}
-                ],
-                temperature=0.1,
-                max_tokens=1000
-            )
-            
-            result_text = response.choices[0].message.content.strip()
-            
-            # 解析JSON
-            try:
-                result = json.loads(result_text)
-            except json.JSONDecodeError:
-                # 提取JSON部分
-                import re
-                json_match = re.search(r'\{.*\}', result_text, re.DOTALL)
-                if json_match:
-                    result = json.loads(json_match.group())
-                else:
-                    raise ValueError("无法解析JSON响应")
+            chunks = self._split_chunks(content)
+            if len(chunks) > 1:
+                result = self._audit_chunks(chunks, strict_level, timeout, mode)
+            else:
+                result = self._call_api(content, strict_level, timeout, mode)
             
             # 缓存结果
-            self.cache[cache_key] = {
-                'result': result,
-                'timestamp': time.time()
-            }
+            self._cache_set(cache_key, content, result)
             
             return result
             
@@ -161,20 +330,147 @@ class DeepSeekAudit:
             # 降级到基础审核
             return self._basic_audit(content, strict_level)
     
-    def _basic_audit(self, content: str, strict_level: int) -> dict:
-        """基础审核（当API不可用时）"""
-        # 基础敏感词库
-        basic_sensitive_words = [
-            "敏感词", "违规内容", "不当言论", "政治", "暴力", 
-            "色情", "赌博", "毒品", "诈骗", "人身攻击"
-        ]
+    def _call_api(self, content: str, strict_level: int, timeout: float = None,
+                  mode: str = 'interactive') -> dict:
+        """调用DeepSeek审核单段内容，失败时抛出异常
         
-        content_lower = content.lower()
-        found_words = []
+        交互审核不重试：超时后重试会让用户等待约两倍的超时时间才降级，后台审核按 max_retries 重试。
+        """
+        if not self.breaker.allow_request():
+            raise CircuitOpenError("DeepSeek接口熔断中")
         
-        for word in basic_sensitive_words:
-            if word in content_lower:
-                found_words.append(word)
+        prompt = self._get_audit_prompt(content, strict_level)
+        
+        start = time.time()
+        try:
+            # with_options 只复制客户端配置，共用连接池
+            client = self.client if mode == 'background' else self.client.with_options(max_retries=0)
+            response = client.chat.completions.create(
+                model="deepseek-chat",
+                messages=[
+                    {"role": "system", "content": "你是一个严格的内容审核助手，必须输出纯JSON格式，不要任何额外文本。"},
+                    {"role": "user", "content": prompt}
+                ],
+                temperature=0.1,
+                max_tokens=1000,
+                **({'timeout': timeout} if timeout else {})
+            )
+        except Exception:
+            self.breaker.record_failure()
+            raise
+        self.breaker.record_success(time.time() - start)
+        
+        result_text = response.choices[0].message.content.strip()
+        
+        # 解析JSON
+        try:
+            return json.loads(result_text)
+        except json.JSONDecodeError:
+            # 提取JSON部分
+            json_match = re.search(r'\{.*\}', result_text, re.DOTALL)
+            if json_match:
+                return json.loads(json_match.group())
+            raise ValueError("无法解析JSON响应")
+    
+    def _split_chunks(self, content: str) -> List[str]:
+        """按段落把长文切分为若干块，各块首尾相接即为原文
+        
+        块边界由段落内容决定（段落哈希命中时切分），修改某一段只会影响
+        它所在的块，其余块的缓存仍然有效。
+        """
+        if len(content) < DEEPSEEK_CONFIG.get('chunk_threshold', 4000):
+            return [content]
+        
+        min_size = DEEPSEEK_CONFIG.get('chunk_min_size', 800)
+        max_size = DEEPSEEK_CONFIG.get('chunk_max_size', 3000)
+        
+        # 段落连同其后的空行作为一个单元，保证拼接后与原文一致
+        parts = re.split(r'(\n\s*\n)', content)
+        paragraphs = [''.join(parts[i:i + 2]) for i in range(0, len(parts), 2)]
+        
+        chunks = []
+        current = ''
+        for paragraph in paragraphs:
+            if current and len(current) + len(paragraph) > max_size:
+                chunks.append(current)
+                current = ''
+            current += paragraph
+            if len(current) >= min_size and zlib.crc32(paragraph.encode('utf-8')) % 4 == 0:
+                chunks.append(current)
+                current = ''
+        if current:
+            chunks.append(current)
+        return chunks
+    
+    def _audit_chunks(self, chunks: List[str], strict_level: int, timeout: float = None,
+                      mode: str = 'interactive') -> dict:
+        """分块审核：已缓存的块直接复用，只把新增或修改的块并发提交审核"""
+        results = [None] * len(chunks)
+        pending = []
+        for i, chunk in enumerate(chunks):
+            cached = self._cache_get(self._get_cache_key(chunk, strict_level), chunk)
+            if cached is not None:
+                results[i] = cached
+            else:
+                pending.append(i)
+        
+        fresh = self._map_concurrent(
+            lambda i: self._call_api(chunks[i], strict_level, timeout, mode),
+            pending
+        )
+        for i, result in zip(pending, fresh):
+            self._cache_set(self._get_cache_key(chunks[i], strict_level), chunks[i], result)
+            results[i] = result
+        
+        merged = self._merge_results(chunks, results)
+        merged['chunks'] = {'total': len(chunks), 'audited': len(pending)}
+        return merged
+    
+    def _merge_results(self, chunks: List[str], results: List[dict]) -> dict:
+        """合并各块的审核结果为整篇文章的结果"""
+        risk_order = {'low': 0, 'medium': 1, 'high': 2}
+        
+        def union(field):
+            merged = []
+            for result in results:
+                for item in result.get(field) or []:
+                    if item not in merged:
+                        merged.append(item)
+            return merged
+        
+        return {
+            "passed": all(result.get('passed', False) for result in results),
+            "score": max(float(result.get('score', 0.0)) for result in results),
+            "reasons": union('reasons'),
+            "suggestions": union('suggestions'),
+            "flagged_keywords": union('flagged_keywords'),
+            "risk_level": max((result.get('risk_level', 'low') for result in results),
+                              key=lambda level: risk_order.get(level, 0)),
+            "sanitized_content": ''.join(result.get('sanitized_content') or chunk
+                                         for chunk, result in zip(chunks, results))
+        }
+    
+    def _map_concurrent(self, func, items: list, max_workers: int = None) -> list:
+        """在线程池中并发执行func，结果顺序与items一致"""
+        if not items:
+            return []
+        
+        max_workers = max_workers or DEEPSEEK_CONFIG.get('batch_concurrency', 8)
+        max_workers = max(1, min(max_workers, len(items)))
+        
+        if max_workers == 1:
+            return [func(item) for item in items]
+        
+        with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='deepseek-audit') as executor:
+            futures = [executor.submit(func, item) for item in items]
+            return [future.result() for future in futures]
+    
+    def _basic_audit(self, content: str, strict_level: int) -> dict:
+        """基础审核（当API不可用时）
+        
+        结果带有 fallback 标记，调用方不应把它当作最终结论长期保存。
+        """
+        _, found_words, matches = self._match_word_list('basic', content)
         
         if found_words:
             return {
@@ -184,7 +480,8 @@ class DeepSeekAudit:
                 "suggestions": ["请修改敏感词汇后重新提交"],
                 "flagged_keywords": found_words,
                 "risk_level": "medium" if len(found_words) <= 2 else "high",
-                "sanitized_content": self._sanitize_content(content, found_words)
+                "sanitized_content": mask_spans(content, matches),
+                "fallback": True
             }
         else:
             return {
@@ -194,23 +491,55 @@ class DeepSeekAudit:
                 "suggestions": [],
                 "flagged_keywords": [],
                 "risk_level": "low",
-                "sanitized_content": content
+                "sanitized_content": content,
+                "fallback": True
             }
     
     def _sanitize_content(self, content: str, flagged_words: list) -> str:
-        """净化内容，将敏感词替换为*"""
-        sanitized = content
-        for word in flagged_words:
-            sanitized = sanitized.replace(word, '*' * len(word))
-        return sanitized
-    
-    def batch_audit(self, contents: List[str], strict_level: int = 2) -> List[dict]:
-        """批量审核"""
-        results = []
-        for content in contents:
-            result = self.audit_content(content, strict_level)
-            results.append(result)
-        return results
+        """净化内容，将敏感词替换为*
+        
+        一次扫描找出所有命中区间，重叠或嵌套的命中合并后统一替换，
+        输出在单个缓冲区中生成，耗时与文章长度成线性关系。
+        """
+        words = tuple(word for word in flagged_words if isinstance(word, str) and word)
+        if not words:
+            return content
+        return _compile_flagged_words(words).mask(content)
+    
+    def _failed_result(self, error: Exception) -> dict:
+        """单条审核失败时的结果"""
+        return {
+            "passed": False,
+            "score": 0.0,
+            "reasons": [f"审核失败: {error}"],
+            "suggestions": ["请稍后重新审核"],
+            "flagged_keywords": [],
+            "risk_level": "unknown",
+            "error": str(error)
+        }
+    
+    def _safe_audit(self, content: str, strict_level: int, timeout: float = None) -> dict:
+        """审核单条内容，异常转为失败结果而不是抛出"""
+        try:
+            return self.audit_content(content, strict_level, timeout=timeout, mode='background')
+        except Exception as e:
+            print(f"批量审核单条失败: {e}")
+            return self._failed_result(e)
+    
+    def batch_audit(self, contents: List[str], strict_level: int = 2,
+                    max_workers: int = None, timeout: float = None) -> List[dict]:
+        """批量审核
+        
+        并发审核多条内容，结果顺序与输入一致；单条失败不影响其他条目。
+        max_workers: 最大并发数，默认取 DEEPSEEK_CONFIG['batch_concurrency']
+        timeout: 单条审核的API超时时间（秒），默认取 DEEPSEEK_CONFIG['batch_item_timeout']
+        """
+        timeout = timeout or DEEPSEEK_CONFIG.get('batch_item_timeout')
+        return self._map_concurrent(
+            lambda content: self._safe_audit(content, strict_level, timeout),
+            contents,
+            max_workers
+        )
 
 # 全局审核实例
 audit_service = None
@@ -6,180 +6,238 @@
 
 import os
 import sqlite3
+import sys
+import time
+from sqlalchemy import MetaData, text
+from sqlalchemy.dialects import sqlite
+from sqlalchemy.schema import CreateIndex, CreateTable
 from app import app
-from models import db
-
-def backup_database():
-    """备份数据库"""
-    if os.path.exists('articles.db'):
-        import shutil
-        backup_name = f'articles_backup_{int(time.time())}.db'
-        shutil.copy2('articles.db', backup_name)
+from models import db, AuditLog, PublishLog
+from config import DATABASE_CONFIG
+
+# 需要按模型重建的表
+REBUILD_MODELS = (AuditLog, PublishLog)
+# 每个事务复制的行数，复制期间其他连接仍可读写
+CHUNK_SIZE = 5000
+# 清理孤立记录时每个事务删除的行数
+CLEAN_BATCH_SIZE = 1000
+
+def database_path():
+    """应用实际使用的SQLite数据库文件（需在应用上下文中调用）"""
+    return db.engine.url.database
+
+def backup_database(path):
+    """备份数据库
+
+    WAL模式下最近的写入可能还在 -wal 文件中，用SQLite备份接口得到一致的副本，
+    不直接复制数据库文件。
+    """
+    if os.path.exists(path):
+        backup_name = os.path.join(os.path.dirname(path), f'articles_backup_{int(time.time())}.db')
+        source = sqlite3.connect(path)
+        target = sqlite3.connect(backup_name)
+        try:
+            source.backup(target)
+        finally:
+            target.close()
+            source.close()
         print(f"✓ 数据库已备份为: {backup_name}")
         return backup_name
     return None
 
-def fix_foreign_keys():
-    """修复外键约束"""
+def _connect(path):
+    # 自动提交模式，事务由 BEGIN/COMMIT 显式控制（DDL也在事务内）
+    conn = sqlite3.connect(path, isolation_level=None)
+    conn.execute(f"PRAGMA busy_timeout = {int(DATABASE_CONFIG['sqlite_busy_timeout'])}")
+    return conn
+
+def _needs_rebuild(conn, table):
+    """表的外键删除规则是否与模型不一致"""
+    current = {row[3]: row[6].upper() for row in conn.execute(f"PRAGMA foreign_key_list({table.name})")}
+    for fk in table.foreign_keys:
+        wanted = (fk.ondelete or 'NO ACTION').upper()
+        if current.get(fk.parent.name, 'NO ACTION') != wanted:
+            return True
+    return False
+
+def _shadow_ddl(table, shadow_name):
+    """按模型生成影子表的建表语句（不含索引，索引在数据复制完成后再建）"""
+    metadata = MetaData()
+    for other in db.metadata.sorted_tables:
+        if other is not table:
+            other.to_metadata(metadata)
+    shadow = table.to_metadata(metadata, name=shadow_name)
+    return str(CreateTable(shadow).compile(dialect=sqlite.dialect()))
+
+def rebuild_table(conn, model, chunk_size=CHUNK_SIZE, dry_run=False):
+    """按SQLite文档中修改表结构的12步流程在线重建表，返回复制的行数
+
+    先分块把数据 INSERT ... SELECT 到影子表（每块一个短事务，复制期间原表照常读写），
+    再在一个事务中补齐复制期间新增/删除的行、删除原表、改名、重建索引和触发器并检查外键，
+    原表到新表的切换是原子的。日志表只追加不修改，补齐时只处理新增和删除。
+    """
+    table = model.__table__
+    name = table.name
+    shadow = f'_{name}_rebuild'
+    existing = [row[1] for row in conn.execute(f"PRAGMA table_info({name})")]
+    columns = ', '.join(column.name for column in table.columns if column.name in existing)
+    total = conn.execute(f"SELECT COUNT(*) FROM {name}").fetchone()[0]
+
+    if dry_run:
+        chunks = (total + chunk_size - 1) // chunk_size
+        print(f"  {name}: {total} 行，将分 {chunks} 块复制到 {shadow} 后切换")
+        return 0
+
+    # 上次中断留下的影子表
+    conn.execute(f"DROP TABLE IF EXISTS {shadow}")
+    conn.execute(_shadow_ddl(table, shadow))
+
+    copied, last_id = 0, 0
+    while True:
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            cursor = conn.execute(
+                f"INSERT INTO {shadow} ({columns}) SELECT {columns} FROM {name} "
+                f"WHERE id > ? ORDER BY id LIMIT ?", (last_id, chunk_size)
+            )
+            count = cursor.rowcount
+            if count:
+                last_id = conn.execute(f"SELECT MAX(id) FROM {shadow}").fetchone()[0]
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        copied += count
+        print(f"  {name}: 已复制 {copied}/{total} 行")
+        if count < chunk_size:
+            break
+
+    foreign_keys = conn.execute("PRAGMA foreign_keys").fetchone()[0]
+    # 删除原表时不能触发外键动作，且该设置只能在事务外修改
+    conn.execute("PRAGMA foreign_keys = OFF")
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            # 补齐复制期间的写入
+            caught_up = conn.execute(
+                f"INSERT INTO {shadow} ({columns}) SELECT {columns} FROM {name} WHERE id > ?", (last_id,)
+            ).rowcount
+            conn.execute(
+                f"DELETE FROM {shadow} WHERE NOT EXISTS (SELECT 1 FROM {name} WHERE {name}.id = {shadow}.id)"
+            )
+            triggers = [row[0] for row in conn.execute(
+                "SELECT sql FROM sqlite_master WHERE type = 'trigger' AND tbl_name = ?", (name,)
+            )]
+
+            conn.execute(f"DROP TABLE {name}")
+            conn.execute(f"ALTER TABLE {shadow} RENAME TO {name}")
+            for index in table.indexes:
+                conn.execute(str(CreateIndex(index).compile(dialect=sqlite.dialect())))
+            for trigger in triggers:
+                conn.execute(trigger)
+
+            violations = conn.execute(f"PRAGMA foreign_key_check({name})").fetchall()
+            if violations:
+                raise RuntimeError(f"{name} 有 {len(violations)} 行违反外键约束，请先清理孤立记录")
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+    finally:
+        conn.execute(f"PRAGMA foreign_keys = {'ON' if foreign_keys else 'OFF'}")
+
+    print(f"✓ {name} 重建完成，共 {copied + caught_up} 行")
+    return copied + caught_up
+
+def fix_foreign_keys(path, chunk_size=CHUNK_SIZE, dry_run=False):
+    """修复外键约束：外键删除规则与模型不一致的日志表按模型重建"""
     print("🔧 修复数据库外键约束...")
-    
-    # 连接到数据库
-    conn = sqlite3.connect('articles.db')
-    cursor = conn.cursor()
-    
+
+    conn = _connect(path)
     try:
-        # 启用外键约束
-        cursor.execute("PRAGMA foreign_keys = ON")
-        
-        # 检查现有的表结构
-        cursor.execute("SELECT sql FROM sqlite_master WHERE type='table' AND name='audit_logs'")
-        audit_logs_sql = cursor.fetchone()
-        
-        cursor.execute("SELECT sql FROM sqlite_master WHERE type='table' AND name='publish_logs'")
-        publish_logs_sql = cursor.fetchone()
-        
-        print("当前表结构:")
-        if audit_logs_sql:
-            print(f"audit_logs: {audit_logs_sql[0]}")
-        if publish_logs_sql:
-            print(f"publish_logs: {publish_logs_sql[0]}")
-        
-        # 检查是否需要重建表
-        need_rebuild = False
-        if audit_logs_sql and 'ON DELETE CASCADE' not in audit_logs_sql[0]:
-            need_rebuild = True
-            print("⚠️  audit_logs表需要重建以支持级联删除")
-        
-        if publish_logs_sql and 'ON DELETE CASCADE' not in publish_logs_sql[0]:
-            need_rebuild = True
-            print("⚠️  publish_logs表需要重建以支持级联删除")
-        
-        if need_rebuild:
-            print("🔄 重建表结构...")
-            
-            # 备份数据
-            cursor.execute("SELECT * FROM audit_logs")
-            audit_data = cursor.fetchall()
-            
-            cursor.execute("SELECT * FROM publish_logs")
-            publish_data = cursor.fetchall()
-            
-            # 删除旧表
-            cursor.execute("DROP TABLE IF EXISTS audit_logs")
-            cursor.execute("DROP TABLE IF EXISTS publish_logs")
-            
-            # 创建新表（带级联删除）
-            cursor.execute("""
-                CREATE TABLE audit_logs (
-                    id INTEGER PRIMARY KEY,
-                    article_id INTEGER NOT NULL,
-                    user_id INTEGER NOT NULL,
-                    passed BOOLEAN NOT NULL,
-                    score FLOAT NOT NULL,
-                    risk_level VARCHAR(20) NOT NULL,
-                    reasons TEXT,
-                    suggestions TEXT,
-                    flagged_keywords TEXT,
-                    strict_level INTEGER DEFAULT 2,
-                    audit_type VARCHAR(20) DEFAULT 'manual',
-                    created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
-                    FOREIGN KEY (article_id) REFERENCES articles(id) ON DELETE CASCADE,
-                    FOREIGN KEY (user_id) REFERENCES users(id)
-                )
-            """)
-            
-            cursor.execute("""
-                CREATE TABLE publish_logs (
-                    id INTEGER PRIMARY KEY,
-                    article_id INTEGER NOT NULL,
-                    user_id INTEGER NOT NULL,
-                    wp_post_id INTEGER,
-                    wp_url VARCHAR(500),
-                    wp_category_id INTEGER,
-                    status VARCHAR(20) NOT NULL,
-                    error_message TEXT,
-                    created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
-                    FOREIGN KEY (article_id) REFERENCES articles(id) ON DELETE CASCADE,
-                    FOREIGN KEY (user_id) REFERENCES users(id)
-                )
-            """)
-            
-            # 恢复数据
-            if audit_data:
-                cursor.executemany("""
-                    INSERT INTO audit_logs 
-                    (id, article_id, user_id, passed, score, risk_level, reasons, suggestions, 
-                     flagged_keywords, strict_level, audit_type, created_at)
-                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-                """, audit_data)
-                print(f"✓ 恢复了 {len(audit_data)} 条审核日志")
-            
-            if publish_data:
-                cursor.executemany("""
-                    INSERT INTO publish_logs 
-                    (id, article_id, user_id, wp_post_id, wp_url, wp_category_id, 
-                     status, error_message, created_at)
-                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-                """, publish_data)
-                print(f"✓ 恢复了 {len(publish_data)} 条发布日志")
-        
-        conn.commit()
-        print("✅ 数据库修复完成")
-        
+        for model in REBUILD_MODELS:
+            table = model.__table__
+            if not conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?",
+                                (table.name,)).fetchone():
+                continue
+            if not _needs_rebuild(conn, table):
+                print(f"✓ {table.name} 外键约束已是最新")
+                continue
+            print(f"⚠️  {table.name}表需要重建以支持级联删除")
+            rebuild_table(conn, model, chunk_size=chunk_size, dry_run=dry_run)
     except Exception as e:
         print(f"❌ 修复失败: {e}")
-        conn.rollback()
         raise
     finally:
         conn.close()
 
-def clean_orphaned_records():
-    """清理孤立记录"""
+def clean_orphaned_records(batch_size=CLEAN_BATCH_SIZE, dry_run=False):
+    """清理没有对应文章的审核日志和发布日志（需在应用上下文中调用）
+
+    按ID顺序分批查找 NOT EXISTS 的孤立行并删除，每批一个事务，已检查过的行不会重复扫描。
+    返回 {表名: 清理（或预览时找到）的行数}。
+    """
     print("🧹 清理孤立记录...")
-    
-    with app.app_context():
-        # 清理没有对应文章的审核日志
-        orphaned_audits = db.session.execute("""
-            DELETE FROM audit_logs 
-            WHERE article_id NOT IN (SELECT id FROM articles)
-        """)
-        
-        # 清理没有对应文章的发布日志
-        orphaned_publishes = db.session.execute("""
-            DELETE FROM publish_logs 
-            WHERE article_id NOT IN (SELECT id FROM articles)
-        """)
-        
-        db.session.commit()
-        print(f"✓ 清理了孤立的审核日志和发布日志")
+
+    result = {}
+    for model in (AuditLog, PublishLog):
+        name = model.__tablename__
+        orphans = text(
+            f"SELECT id FROM {name} WHERE id > :last_id "
+            f"AND NOT EXISTS (SELECT 1 FROM articles WHERE articles.id = {name}.article_id) "
+            f"ORDER BY id LIMIT :limit"
+        )
+        removed, last_id = 0, 0
+        while True:
+            ids = db.session.execute(orphans, {'last_id': last_id, 'limit': batch_size}).scalars().all()
+            if not ids:
+                break
+            last_id = ids[-1]
+            if not dry_run:
+                db.session.execute(model.__table__.delete().where(model.__table__.c.id.in_(ids)))
+                db.session.commit()
+            removed += len(ids)
+            if len(ids) < batch_size:
+                break
+        result[name] = removed
+        print(f"{'  找到' if dry_run else '✓ 清理了'} {removed} 条孤立的{name}记录")
+    return result
 
 def main():
     """主函数"""
     print("🔧 数据库修复工具")
     print("=" * 40)
-    
-    if not os.path.exists('articles.db'):
-        print("❌ 未找到数据库文件 articles.db")
-        return
-    
-    # 备份数据库
-    import time
-    backup_file = backup_database()
-    
-    try:
-        # 修复外键约束
-        fix_foreign_keys()
-        
-        # 清理孤立记录
-        clean_orphaned_records()
-        
-        print("\n🎉 数据库修复完成！")
-        print("现在可以正常删除文章了")
-        
-    except Exception as e:
-        print(f"\n❌ 修复失败: {e}")
-        if backup_file:
-            print(f"可以从备份文件恢复: {backup_file}")
+
+    dry_run = '--dry-run' in sys.argv
+    with app.app_context():
+        path = database_path()
+        if not path or not os.path.exists(path):
+            print(f"❌ 未找到数据库文件 {path or 'articles.db'}")
+            return
+
+        if dry_run:
+            print("预览模式：只列出将执行的操作，不修改数据库")
+            clean_orphaned_records(dry_run=True)
+            fix_foreign_keys(path, dry_run=True)
+            return
+
+        # 备份数据库
+        backup_file = backup_database(path)
+
+        try:
+            # 先清理孤立记录，重建后的外键检查才能通过
+            clean_orphaned_records()
+
+            # 修复外键约束
+            fix_foreign_keys(path)
+
+            print("\n🎉 数据库修复完成！")
+            print("现在可以正常删除文章了")
+
+        except Exception as e:
+            print(f"\n❌ 修复失败: {e}")
+            if backup_file:
+                print(f"可以从备份文件恢复: {backup_file}")
 
 if __name__ == '__main__':
-    main()
\ No newline at end of file
+    main()
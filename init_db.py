@@ -11,7 +11,9 @@ import sys
 os.environ.setdefault('DEEPSEEK_API_KEY', '')
 
 from flask import Flask
+from flask_migrate import Migrate, stamp
 from models import db, User, Tag
+from article_search import create_search_index
 from config import Config
 
 def create_app():
@@ -19,6 +21,7 @@ def create_app():
     app = Flask(__name__)
     app.config.from_object(Config)
     db.init_app(app)
+    Migrate(app, db, render_as_batch=True)
     return app
 
 def init_database():
@@ -31,6 +34,14 @@ def init_database():
             db.create_all()
             print("✓ 数据库表创建完成")
             
+            if create_search_index(db.session.connection()):
+                print("✓ 文章全文索引已创建")
+            
+            # 新建的数据库已是最新结构，标记迁移版本，之后可直接 flask db upgrade
+            if os.path.isdir('migrations'):
+                stamp()
+                print("✓ 数据库迁移版本已标记为最新")
+            
             # 创建默认管理员用户
             admin_user = User.query.filter_by(username='admin').first()
             if not admin_user:
@@ -0,0 +1,167 @@
+"""
+多模式关键词匹配
+基于Aho-Corasick自动机，一次扫描文本即可找出所有命中的关键词及其位置
+"""
+
+from collections import deque
+from typing import Iterable, List, Tuple
+
+
+class KeywordMatcher:
+    """编译后的关键词自动机
+
+    词库只在构建时编译一次，之后每次匹配的开销只与文本长度和命中数有关，
+    与词库大小无关。
+    """
+
+    def __init__(self, words: Iterable[str], ignore_case: bool = True):
+        self.ignore_case = ignore_case
+        self.words: List[str] = []
+        self._lengths: List[int] = []
+        self._word_index = {}
+
+        # goto表、失败指针、输出表（每个状态命中的关键词下标）
+        self._goto = [{}]
+        self._fail = [0]
+        self._output = [()]
+
+        for word in words:
+            if not word:
+                continue
+            key = word.lower() if ignore_case else word
+            if key in self._word_index:
+                continue
+            self._word_index[key] = len(self.words)
+            self.words.append(word)
+            self._lengths.append(len(key))
+            self._add_pattern(key, len(self.words) - 1)
+
+        self._build_failure_links()
+
+    def __len__(self) -> int:
+        return len(self.words)
+
+    def _add_pattern(self, pattern: str, index: int):
+        """将关键词插入字典树"""
+        state = 0
+        for ch in pattern:
+            next_state = self._goto[state].get(ch)
+            if next_state is None:
+                next_state = len(self._goto)
+                self._goto[state][ch] = next_state
+                self._goto.append({})
+                self._fail.append(0)
+                self._output.append(())
+            state = next_state
+        self._output[state] = (index,)
+
+    def _build_failure_links(self):
+        """广度优先构建失败指针，并把后缀状态的输出合并进来"""
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for ch, next_state in self._goto[state].items():
+                queue.append(next_state)
+                fallback = self._fail[state]
+                while fallback and ch not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                target = self._goto[fallback].get(ch, 0)
+                self._fail[next_state] = target if target != next_state else 0
+                if self._output[self._fail[next_state]]:
+                    self._output[next_state] = self._output[next_state] + self._output[self._fail[next_state]]
+
+    def _prepare(self, text: str) -> Tuple[str, List[int]]:
+        """返回用于匹配的文本，以及其中每个字符在原文中的下标（长度不变时为None）"""
+        if not self.ignore_case:
+            return text, None
+        lowered = text.lower()
+        if len(lowered) == len(text):
+            return lowered, None
+        # 少数字符小写后长度会变化（如'İ'），逐字符记录原文位置以保证偏移准确
+        chars = []
+        origin = []
+        for i, ch in enumerate(text):
+            for lower_ch in ch.lower():
+                chars.append(lower_ch)
+                origin.append(i)
+        return ''.join(chars), origin
+
+    def _scan(self, text: str):
+        """逐个产出命中 (start, end, 关键词下标)"""
+        scan_text, origin = self._prepare(text)
+        goto = self._goto
+        fail = self._fail
+        output = self._output
+        lengths = self._lengths
+        state = 0
+
+        for pos, ch in enumerate(scan_text):
+            while state and ch not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(ch, 0)
+            if not output[state]:
+                continue
+            for index in output[state]:
+                start = pos - lengths[index] + 1
+                if origin is None:
+                    yield start, pos + 1, index
+                else:
+                    yield origin[start], origin[pos] + 1, index
+
+    def iter_matches(self, text: str):
+        """逐个产出命中 (start, end, word)，end为开区间，偏移基于原文"""
+        words = self.words
+        for start, end, index in self._scan(text):
+            yield start, end, words[index]
+
+    def find_all(self, text: str) -> List[Tuple[int, int, str]]:
+        """返回所有命中 (start, end, word)，按结束位置排序，允许重叠"""
+        return list(self.iter_matches(text))
+
+    def find_words(self, text: str) -> List[str]:
+        """返回命中的关键词（去重），顺序与词库顺序一致"""
+        found = {index for _, _, index in self._scan(text)}
+        return [self.words[i] for i in sorted(found)]
+
+    def words_in(self, matches: List[Tuple[int, int, str]]) -> List[str]:
+        """从find_all的结果中取出命中的关键词（去重），顺序与词库顺序一致"""
+        found = {self._word_index[w.lower() if self.ignore_case else w] for _, _, w in matches}
+        return [self.words[i] for i in sorted(found)]
+
+    def mask(self, text: str, mask_char: str = '*') -> str:
+        """将所有命中的关键词替换为掩码字符"""
+        return mask_spans(text, self.find_all(text), mask_char)
+
+    def contains_any(self, text: str) -> bool:
+        """是否命中任意关键词"""
+        for _ in self._scan(text):
+            return True
+        return False
+
+
+def mask_spans(text: str, spans: Iterable[Tuple], mask_char: str = '*') -> str:
+    """按命中区间一次性生成掩码后的文本
+
+    spans中每项的前两个元素为 (start, end)。重叠或嵌套的区间先按起点排序
+    再合并，结果只取决于被覆盖的字符集合，与关键词顺序无关。
+    """
+    intervals = sorted((span[0], span[1]) for span in spans)
+    if not intervals:
+        return text
+
+    parts = []
+    cursor = 0
+    cur_start, cur_end = intervals[0]
+    for start, end in intervals[1:]:
+        if start <= cur_end:
+            if end > cur_end:
+                cur_end = end
+            continue
+        parts.append(text[cursor:cur_start])
+        parts.append(mask_char * (cur_end - cur_start))
+        cursor = cur_end
+        cur_start, cur_end = start, end
+    parts.append(text[cursor:cur_start])
+    parts.append(mask_char * (cur_end - cur_start))
+    parts.append(text[cur_end:])
+    return ''.join(parts)
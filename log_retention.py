@@ -0,0 +1,164 @@
+"""
+日志保留
+审核日志、发布日志超过保留期后：按天、按用户汇总到 log_daily_rollups，原始记录写入
+gzip压缩的JSONL归档文件，再分批删除。汇总和删除在同一个事务里提交，中断后重跑不会重复计数；
+归档文件先于提交写入磁盘，中断时最后一批可能在下次运行的归档中重复出现，但不会丢失
+"""
+
+import gzip
+import json
+import os
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+from sqlalchemy import select
+
+from config import LOG_RETENTION_CONFIG
+from models import db, AuditLog, PublishLog, LogDailyRollup
+
+# 表名 -> (汇总中的日志类型, 模型)
+LOG_TABLES = {
+    'audit_logs': ('audit', AuditLog),
+    'publish_logs': ('publish', PublishLog),
+}
+
+
+def _row_counts(log_type, row) -> dict:
+    """单条日志对汇总的贡献"""
+    if log_type == 'audit':
+        return {
+            'total': 1,
+            'succeeded': 1 if row.passed else 0,
+            'failed': 0 if row.passed else 1,
+            'high_risk': 1 if row.risk_level == 'high' else 0,
+            'medium_risk': 1 if row.risk_level == 'medium' else 0,
+            'low_risk': 1 if row.risk_level == 'low' else 0,
+            'score_sum': row.score or 0.0,
+        }
+    return {
+        'total': 1,
+        'succeeded': 1 if row.status == 'success' else 0,
+        'failed': 1 if row.status == 'failed' else 0,
+        'high_risk': 0,
+        'medium_risk': 0,
+        'low_risk': 0,
+        'score_sum': 0.0,
+    }
+
+
+def _json_default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f'无法序列化 {type(value).__name__}')
+
+
+def retention_cutoff(keep_days: int, now: datetime = None) -> datetime:
+    """保留期的起点（按天对齐），早于该时间的日志会被清理"""
+    now = now or datetime.utcnow()
+    return datetime(now.year, now.month, now.day) - timedelta(days=keep_days)
+
+
+class ArchiveWriter:
+    """按需创建的gzip JSONL归档文件，写入第一条记录时才创建"""
+
+    def __init__(self, archive_dir: str, name: str, now: datetime):
+        self.path = os.path.join(archive_dir, f"{name}-{now.strftime('%Y%m%dT%H%M%S')}.jsonl.gz")
+        self.count = 0
+        self._raw = None
+        self._file = None
+
+    def write(self, rows):
+        if self._file is None:
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            self._raw = open(self.path, 'ab')
+            self._file = gzip.GzipFile(fileobj=self._raw, mode='ab')
+        for row in rows:
+            line = json.dumps(dict(row._mapping), ensure_ascii=False, default=_json_default)
+            self._file.write(line.encode('utf-8') + b'\n')
+        self.count += len(rows)
+        # 删除前确保这批记录已落盘
+        self._file.flush()
+        self._raw.flush()
+        os.fsync(self._raw.fileno())
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._raw.close()
+
+
+def prune_log_table(name: str, policy: dict, archive_dir: str, batch_size: int,
+                    now: datetime = None, dry_run: bool = False) -> dict:
+    """按保留策略处理一张日志表，返回处理结果"""
+    log_type, model = LOG_TABLES[name]
+    table = model.__table__
+    now = now or datetime.utcnow()
+    result = {'cutoff': None, 'matched': 0, 'rolled_up': 0, 'archived': 0, 'deleted': 0, 'archive_file': None}
+
+    keep_days = policy.get('keep_days', 0)
+    if not keep_days:
+        return result
+    cutoff = retention_cutoff(keep_days, now)
+    result['cutoff'] = cutoff.isoformat()
+
+    writer = ArchiveWriter(archive_dir, name, now) if policy.get('archive') and not dry_run else None
+    last_id = 0
+    try:
+        while True:
+            rows = db.session.execute(
+                select(table)
+                .where(table.c.created_at < cutoff, table.c.id > last_id)
+                .order_by(table.c.id)
+                .limit(batch_size)
+            ).all()
+            if not rows:
+                break
+            last_id = rows[-1].id
+            result['matched'] += len(rows)
+
+            if not dry_run:
+                if writer is not None:
+                    writer.write(rows)
+                    result['archived'] += len(rows)
+
+                if policy.get('rollup'):
+                    groups = defaultdict(lambda: defaultdict(float))
+                    for row in rows:
+                        counts = groups[(row.user_id, row.created_at.date())]
+                        for key, value in _row_counts(log_type, row).items():
+                            counts[key] += value
+                    connection = db.session.connection()
+                    for (user_id, day), counts in groups.items():
+                        LogDailyRollup.merge(connection, log_type, user_id, day,
+                                             {key: (value if key == 'score_sum' else int(value))
+                                              for key, value in counts.items()})
+                    result['rolled_up'] += len(rows)
+
+                deleted = db.session.execute(table.delete().where(table.c.id.in_([row.id for row in rows])))
+                db.session.commit()
+                result['deleted'] += deleted.rowcount
+
+            if len(rows) < batch_size:
+                break
+    except Exception:
+        db.session.rollback()
+        raise
+    finally:
+        if writer is not None:
+            writer.close()
+            if writer.count:
+                result['archive_file'] = writer.path
+
+    return result
+
+
+def run_retention(log_types=None, now: datetime = None, dry_run: bool = False, config: dict = None) -> dict:
+    """按配置的策略处理各日志表（需在应用上下文中调用）"""
+    config = config or LOG_RETENTION_CONFIG
+    results = {}
+    for name, policy in config['policies'].items():
+        if log_types and name not in log_types:
+            continue
+        results[name] = prune_log_table(name, policy, config['archive_dir'], config['batch_size'],
+                                        now=now, dry_run=dry_run)
+    return results
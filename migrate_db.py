@@ -4,106 +4,399 @@
 用于从内存存储迁移到数据库存储
 """
 
+import gzip
+import itertools
 import json
+import os
+import time
 from datetime import datetime
+from sqlalchemy.orm import selectinload
 from app import app
-from models import db, User, Article, Tag
+from models import db, User, Article, Tag, UserArticleStats, article_tags
 
-def migrate_from_memory():
-    """从内存数据迁移到数据库"""
+# 导入时每个事务写入的文章数
+IMPORT_BATCH_SIZE = 1000
+# 解析JSON数组时每次读入的字符数
+_READ_CHUNK = 1 << 20
+
+
+def _open_input(path):
+    """按扩展名打开备份文件（.gz / .zst 为压缩文件）"""
+    if path.endswith('.gz'):
+        return open_backup_file(path, 'rt', 'gzip')
+    if path.endswith('.zst'):
+        return open_backup_file(path, 'rt', 'zstd')
+    return open(path, 'r', encoding='utf-8')
+
+
+def iter_records(f):
+    """逐条读取备份记录，支持JSON数组和JSONL（每行一个对象），不把整个文件读入内存"""
+    first = f.read(1)
+    while first and first.isspace():
+        first = f.read(1)
+    if not first:
+        return
+    if first != '[':
+        for line in itertools.chain([first + f.readline()], f):
+            if line.strip():
+                yield json.loads(line)
+        return
+
+    decoder = json.JSONDecoder()
+    buffer, pos = f.read(_READ_CHUNK), 0
+    while True:
+        # 跳过空白和逗号，缓冲区读完时继续读入
+        while True:
+            while pos < len(buffer) and buffer[pos] in ' \t\r\n,':
+                pos += 1
+            if pos < len(buffer):
+                break
+            buffer, pos = f.read(_READ_CHUNK), 0
+            if not buffer:
+                raise ValueError('JSON数组不完整：缺少结尾的 ]')
+        if buffer[pos] == ']':
+            return
+        try:
+            record, end = decoder.raw_decode(buffer, pos)
+        except json.JSONDecodeError:
+            # 记录跨越了缓冲区边界
+            chunk = f.read(_READ_CHUNK)
+            if not chunk:
+                raise
+            buffer, pos = buffer[pos:] + chunk, 0
+            continue
+        yield record
+        pos = end
+
+
+def _parse_time(value):
+    # 兼容备份中的 '%Y-%m-%d %H:%M:%S' 和ISO格式
+    return datetime.fromisoformat(value) if value else None
+
+
+def _json_text(value):
+    # 备份中为列表，旧数据中可能已经是JSON字符串
+    if value is None or isinstance(value, str):
+        return value
+    return json.dumps(value, ensure_ascii=False)
+
+
+def _article_row(data, user_id):
+    """备份记录转换为 articles 表的一行"""
+    content = data.get('content') or ''
+    published = bool(data.get('is_published', data.get('published', False)))
+    created_at = _parse_time(data.get('created_at')) or datetime.utcnow()
+    row = {
+        'title': data['title'],
+        'content': content,
+        'summary': data.get('summary'),
+        'created_at': created_at,
+        'updated_at': _parse_time(data.get('updated_at')) or created_at,
+        'published_at': _parse_time(data.get('published_at')),
+        'status': data.get('status') or ('published' if published else 'draft'),
+        'is_published': published,
+        'audit_score': data.get('audit_score', 0.0),
+        'risk_level': data.get('risk_level', 'low'),
+        'audit_passed': data.get('audit_passed'),
+        'audit_reasons': _json_text(data.get('audit_reasons')),
+        'audit_suggestions': _json_text(data.get('audit_suggestions')),
+        'flagged_keywords': _json_text(data.get('flagged_keywords')),
+        'audit_status': 'done',
+        'wp_post_id': data.get('wp_post_id'),
+        'wp_url': data.get('wp_url'),
+        'view_count': data.get('view_count', 0),
+        'word_count': data.get('word_count'),
+        'user_id': user_id,
+    }
+    if not row['summary'] or row['word_count'] is None:
+        # 集合式插入不触发ORM事件，缺少的字数和摘要在这里补齐
+        article = Article(content=content)
+        article.update_word_count()
+        article.generate_summary()
+        row['summary'] = row['summary'] or article.summary
+        if row['word_count'] is None:
+            row['word_count'] = article.word_count
+    return row
+
+
+def _existing_titles(rows):
+    """一批文章中已存在的 (user_id, title)，每个用户一条走 ix_articles_user_title 索引的IN查询"""
+    titles_by_user = {}
+    for row in rows:
+        titles_by_user.setdefault(row['user_id'], set()).add(row['title'])
+    existing = set()
+    for user_id, titles in titles_by_user.items():
+        existing.update(db.session.query(Article.user_id, Article.title).filter(
+            Article.user_id == user_id, Article.title.in_(titles)
+        ))
+    return existing
+
+
+def _insert_articles(rows):
+    """executemany插入一批文章，按传入顺序返回新文章ID
+
+    同一批内 (user_id, title) 已去重，插入后用一条走索引的查询取回ID。
+    （SQLite上要求按参数顺序返回的 RETURNING 会退化为逐行执行）
+    """
+    db.session.execute(Article.__table__.insert(), rows)
+    ids = {}
+    for user_id, title, article_id in db.session.query(Article.user_id, Article.title, Article.id).filter(
+        Article.user_id.in_({row['user_id'] for row in rows}),
+        Article.title.in_([row['title'] for row in rows])
+    ).order_by(Article.id):
+        ids[(user_id, title)] = article_id
+    return [ids[(row['user_id'], row['title'])] for row in rows]
+
+
+def _import_batch(batch, users, default_user_id):
+    """导入一批记录，返回 (导入数, 跳过数)"""
+    rows, tag_names, skipped = [], [], 0
+    seen = set()
+    for data in batch:
+        if not data.get('title'):
+            skipped += 1
+            continue
+        row = _article_row(data, users.get(data.get('author'), default_user_id))
+        key = (row['user_id'], row['title'])
+        if key in seen:
+            skipped += 1
+            continue
+        seen.add(key)
+        rows.append(row)
+        tag_names.append(data.get('tags') or [])
+
+    existing = _existing_titles(rows) if rows else set()
+    keep = [i for i, row in enumerate(rows) if (row['user_id'], row['title']) not in existing]
+    skipped += len(rows) - len(keep)
+    rows = [rows[i] for i in keep]
+    tag_names = [tag_names[i] for i in keep]
+    if not rows:
+        return 0, skipped
+
+    article_ids = _insert_articles(rows)
+    tags = {tag.name: tag.id for tag in Tag.resolve(name for names in tag_names for name in names)}
+    links = {(article_id, tags[name.strip()])
+             for article_id, names in zip(article_ids, tag_names)
+             for name in names if name and name.strip()}
+    if links:
+        db.session.execute(article_tags.insert(), [{'article_id': a, 'tag_id': t} for a, t in links])
+    return len(rows), skipped
+
+
+def import_articles(path, default_user_id, batch_size=IMPORT_BATCH_SIZE, resume=True):
+    """流式导入备份文件中的文章（需在应用上下文中调用）
+
+    每 batch_size 条记录用一次 executemany 插入并提交；按 (user_id, title) 去重，
+    已存在的文章跳过，标签和审核字段一并恢复。记录按作者用户名归属，找不到的归到
+    default_user_id。进度写入 <文件>.import_state.json，中断后重新执行从上次提交处继续，
+    完成后删除进度文件。
+    """
+    state_path = path + '.import_state.json'
+    state = {'processed': 0, 'imported': 0, 'skipped': 0}
+    if resume and os.path.exists(state_path):
+        with open(state_path, 'r', encoding='utf-8') as f:
+            state = json.load(f)
+        print(f"从第 {state['processed']} 条记录继续导入")
+    resume_from = state['processed']
+
+    users = {name: user_id for name, user_id in db.session.query(User.username, User.id)}
+    touched_users = set()
+    started = time.time()
+    with _open_input(path) as f:
+        records = itertools.islice(iter_records(f), resume_from, None)
+        while True:
+            batch = list(itertools.islice(records, batch_size))
+            if not batch:
+                break
+            try:
+                imported, skipped = _import_batch(batch, users, default_user_id)
+                db.session.commit()
+            except Exception:
+                db.session.rollback()
+                raise
+            touched_users.update(users.get(data.get('author'), default_user_id) for data in batch)
+            state['processed'] += len(batch)
+            state['imported'] += imported
+            state['skipped'] += skipped
+            with open(state_path + '.tmp', 'w', encoding='utf-8') as out:
+                json.dump(state, out)
+            os.replace(state_path + '.tmp', state_path)
+            rate = (state['processed'] - resume_from) / max(time.time() - started, 1e-6)
+            print(f"已处理 {state['processed']} 条：导入 {state['imported']}，跳过 {state['skipped']}（{rate:.0f} 条/秒）")
+
+    # 集合式插入不触发统计表的增量维护，导入结束后按涉及的用户重建
+    if touched_users and UserArticleStats.enabled():
+        UserArticleStats.rebuild(list(touched_users))
+        db.session.commit()
+    if os.path.exists(state_path):
+        os.remove(state_path)
+    return state
+
+
+def migrate_from_memory(path='articles_backup.json', batch_size=IMPORT_BATCH_SIZE):
+    """从备份文件迁移数据到数据库（JSON数组或JSONL，可为gzip/zstd压缩）"""
     with app.app_context():
-        # 这里可以添加从旧数据文件导入的逻辑
-        # 例如从JSON文件导入文章数据
+        admin_user = User.query.filter_by(username='admin').first()
+        if not admin_user:
+            print("请先创建管理员用户")
+            return
         
-        # 示例：从articles.json导入数据
         try:
-            with open('articles_backup.json', 'r', encoding='utf-8') as f:
-                articles_data = json.load(f)
-                
-            admin_user = User.query.filter_by(username='admin').first()
-            if not admin_user:
-                print("请先创建管理员用户")
-                return
-            
-            for article_data in articles_data:
-                # 检查文章是否已存在
-                existing_article = Article.query.filter_by(
-                    title=article_data['title'],
-                    user_id=admin_user.id
-                ).first()
-                
-                if not existing_article:
-                    article = Article(
-                        title=article_data['title'],
-                        content=article_data['content'],
-                        user_id=admin_user.id,
-                        status='published' if article_data.get('published', False) else 'draft',
-                        is_published=article_data.get('published', False),
-                        created_at=datetime.strptime(article_data['created_at'], '%Y-%m-%d %H:%M:%S'),
-                        updated_at=datetime.strptime(article_data['updated_at'], '%Y-%m-%d %H:%M:%S'),
-                        audit_score=article_data.get('audit_score', 0.0),
-                        risk_level=article_data.get('risk_level', 'low'),
-                        wp_post_id=article_data.get('wp_post_id')
-                    )
-                    
-                    # 更新字数和摘要
-                    article.update_word_count()
-                    article.generate_summary()
-                    
-                    db.session.add(article)
-                    print(f"导入文章: {article.title}")
-            
-            db.session.commit()
-            print("数据迁移完成！")
-            
+            state = import_articles(path, admin_user.id, batch_size)
+            print(f"数据迁移完成！导入 {state['imported']} 篇，跳过 {state['skipped']} 篇")
         except FileNotFoundError:
-            print("未找到备份文件 articles_backup.json")
+            print(f"未找到备份文件 {path}")
         except Exception as e:
-            print(f"迁移失败: {e}")
-            db.session.rollback()
+            print(f"迁移失败: {e}，重新执行将从上次提交处继续")
+
+# 备份文件目录和增量备份水位
+BACKUP_DIR = '.'
+BACKUP_STATE_FILE = 'backup_state.json'
+# 每次从数据库取出的文章数
+BACKUP_BATCH_SIZE = 500
+
+
+def _format_time(value):
+    return value.strftime('%Y-%m-%d %H:%M:%S') if value else None
+
+
+def article_record(article):
+    """一篇文章的备份记录（migrate 导入使用相同格式）"""
+    return {
+        'id': article.id,
+        'title': article.title,
+        'content': article.content,
+        'summary': article.summary,
+        'created_at': _format_time(article.created_at),
+        'updated_at': _format_time(article.updated_at),
+        'published_at': _format_time(article.published_at),
+        'status': article.status,
+        'is_published': article.is_published,
+        'audit_score': article.audit_score,
+        'risk_level': article.risk_level,
+        'audit_passed': article.audit_passed,
+        'audit_reasons': json.loads(article.audit_reasons) if article.audit_reasons else [],
+        'audit_suggestions': json.loads(article.audit_suggestions) if article.audit_suggestions else [],
+        'flagged_keywords': json.loads(article.flagged_keywords) if article.flagged_keywords else [],
+        'wp_post_id': article.wp_post_id,
+        'wp_url': article.wp_url,
+        'word_count': article.word_count,
+        'author': article.author.username,
+        'tags': [tag.name for tag in article.tags]
+    }
+
+
+def open_backup_file(path, mode='wt', compression='gzip'):
+    """打开压缩的JSONL备份文件（gzip 或 zstd）"""
+    if compression == 'gzip':
+        return gzip.open(path, mode, encoding='utf-8')
+    if compression == 'zstd':
+        try:
+            import zstandard
+        except ImportError:
+            raise RuntimeError('zstd压缩需要安装 zstandard: pip install zstandard')
+        return zstandard.open(path, mode, encoding='utf-8')
+    raise ValueError(f'不支持的压缩格式: {compression}')
+
+
+def _load_state(backup_dir):
+    path = os.path.join(backup_dir, BACKUP_STATE_FILE)
+    if not os.path.exists(path):
+        return {}
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
 
-def backup_to_json():
-    """备份数据库数据到JSON文件"""
+
+def _save_state(backup_dir, state):
+    # 先写临时文件再替换，中断时不会留下损坏的水位文件
+    path = os.path.join(backup_dir, BACKUP_STATE_FILE)
+    with open(path + '.tmp', 'w', encoding='utf-8') as f:
+        json.dump(state, f, ensure_ascii=False, indent=2)
+    os.replace(path + '.tmp', path)
+
+
+def iter_articles(since=None, batch_size=BACKUP_BATCH_SIZE):
+    """分批流式读取文章，标签和作者随每批预加载
+
+    since 不为空时只读取 updated_at 晚于该时间的文章（增量备份）。
+    """
+    query = db.select(Article).options(selectinload(Article.tags), selectinload(Article.author))
+    if since is not None:
+        query = query.where(Article.updated_at > since)
+    return db.session.execute(
+        query.order_by(Article.id).execution_options(yield_per=batch_size)
+    ).scalars()
+
+
+def export_articles(path, since=None, compression='gzip'):
+    """把文章逐条写入压缩的JSONL文件（需在应用上下文中调用）
+
+    返回 (文章数, 已写出文章中最大的 updated_at)。
+    """
+    count = 0
+    watermark = since
+    with open_backup_file(path, 'wt', compression) as f:
+        for article in iter_articles(since):
+            f.write(json.dumps(article_record(article), ensure_ascii=False))
+            f.write('\n')
+            if article.updated_at and (watermark is None or article.updated_at > watermark):
+                watermark = article.updated_at
+            count += 1
+            # 已写出的文章不再需要留在会话中
+            db.session.expunge(article)
+    return count, watermark
+
+
+def backup_to_json(incremental=False, compression='gzip', backup_dir=BACKUP_DIR):
+    """备份数据库数据到压缩的JSONL文件（每行一篇文章），返回备份文件路径
+
+    逐条写出，内存占用与文章总数无关。每次备份后在 backup_state.json 中记录已备份的
+    最大 updated_at 作为水位；incremental=True 时只备份水位之后修改过的文章。
+    增量备份不包含已删除的文章，恢复时依次导入最近一次全量备份和之后的增量备份。
+    """
     with app.app_context():
-        articles = Article.query.all()
-        articles_data = []
-        
-        for article in articles:
-            articles_data.append({
-                'id': article.id,
-                'title': article.title,
-                'content': article.content,
-                'summary': article.summary,
-                'created_at': article.created_at.strftime('%Y-%m-%d %H:%M:%S'),
-                'updated_at': article.updated_at.strftime('%Y-%m-%d %H:%M:%S'),
-                'published_at': article.published_at.strftime('%Y-%m-%d %H:%M:%S') if article.published_at else None,
-                'status': article.status,
-                'is_published': article.is_published,
-                'audit_score': article.audit_score,
-                'risk_level': article.risk_level,
-                'wp_post_id': article.wp_post_id,
-                'wp_url': article.wp_url,
-                'word_count': article.word_count,
-                'author': article.author.username,
-                'tags': [tag.name for tag in article.tags]
-            })
+        state = _load_state(backup_dir)
+        since = None
+        if incremental:
+            if not state.get('watermark'):
+                print("未找到上次备份的水位，改为全量备份")
+            else:
+                since = datetime.fromisoformat(state['watermark'])
         
-        with open(f'articles_backup_{datetime.now().strftime("%Y%m%d_%H%M%S")}.json', 'w', encoding='utf-8') as f:
-            json.dump(articles_data, f, ensure_ascii=False, indent=2)
+        kind = 'incremental' if since else 'full'
+        extension = 'zst' if compression == 'zstd' else 'gz'
+        path = os.path.join(backup_dir, f'articles_backup_{datetime.now().strftime("%Y%m%d_%H%M%S")}_{kind}.jsonl.{extension}')
+        try:
+            count, watermark = export_articles(path, since, compression)
+        except Exception:
+            # 不留下不完整的备份文件，水位也保持不变
+            if os.path.exists(path):
+                os.remove(path)
+            raise
         
-        print(f"已备份 {len(articles_data)} 篇文章到JSON文件")
+        _save_state(backup_dir, {
+            'watermark': watermark.isoformat() if watermark else None,
+            'last_backup': os.path.basename(path),
+            'kind': kind,
+            'count': count,
+        })
+        print(f"已备份 {count} 篇文章到 {path}" + ("（增量）" if since else ""))
+        return path
 
 if __name__ == '__main__':
     import sys
     
     if len(sys.argv) > 1:
         if sys.argv[1] == 'backup':
-            backup_to_json()
+            backup_to_json(incremental='--incremental' in sys.argv,
+                           compression='zstd' if '--zstd' in sys.argv else 'gzip')
         elif sys.argv[1] == 'migrate':
-            migrate_from_memory()
+            migrate_from_memory(*sys.argv[2:3])
         else:
-            print("用法: python migrate_db.py [backup|migrate]")
+            print("用法: python migrate_db.py [backup [--incremental] [--zstd]|migrate [文件]]")
     else:
-        print("用法: python migrate_db.py [backup|migrate]")
-        print("  backup  - 备份当前数据库到JSON文件")
-        print("  migrate - 从JSON文件迁移数据到数据库")
\ No newline at end of file
+        print("用法: python migrate_db.py [backup [--incremental] [--zstd]|migrate [文件]]")
+        print("  backup  - 备份当前数据库到压缩的JSONL文件")
+        print("            --incremental 只备份上次备份后修改过的文章，--zstd 使用zstd压缩")
+        print("  migrate - 从备份文件（JSON数组或JSONL，可为.gz/.zst）导入数据到数据库，")
+        print("            默认 articles_backup.json；中断后重新执行从上次提交处继续")
\ No newline at end of file
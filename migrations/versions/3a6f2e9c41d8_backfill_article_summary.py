@@ -0,0 +1,50 @@
+"""backfill article summary
+
+Revision ID: 3a6f2e9c41d8
+Revises: e4b8c15f7d90
+Create Date: 2026-10-18 04:12:37.208846
+
+"""
+import re
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3a6f2e9c41d8'
+down_revision = 'e4b8c15f7d90'
+branch_labels = None
+depends_on = None
+
+BATCH_SIZE = 500
+
+
+def _summary(content, length=200):
+    # 编写本迁移时 Article.generate_summary 的规则（之后摘要改由 article_text.extract_text 生成）。
+    # 迁移保持当时的实现，不依赖会变化的应用代码；这里补齐的摘要在文章下次保存时按新规则重新生成
+    clean_text = re.sub(r'<[^>]+>', '', content or '')
+    clean_text = re.sub(r'[#*`\[\]()_~]', '', clean_text).strip()
+    return clean_text if len(clean_text) <= length else clean_text[:length] + '...'
+
+
+def upgrade():
+    # 列表页只读取摘要而不加载正文，补齐摘要为空的旧文章
+    connection = op.get_bind()
+    last_id = 0
+    while True:
+        rows = connection.execute(sa.text(
+            "SELECT id, content FROM articles "
+            "WHERE id > :last_id AND (summary IS NULL OR summary = '') ORDER BY id LIMIT :limit"
+        ), {'last_id': last_id, 'limit': BATCH_SIZE}).all()
+        if not rows:
+            break
+        connection.execute(
+            sa.text("UPDATE articles SET summary = :summary WHERE id = :id"),
+            [{'id': row.id, 'summary': _summary(row.content)} for row in rows]
+        )
+        last_id = rows[-1].id
+
+
+def downgrade():
+    pass
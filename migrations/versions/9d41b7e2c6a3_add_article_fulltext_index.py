@@ -0,0 +1,62 @@
+"""add article fulltext index
+
+Revision ID: 9d41b7e2c6a3
+Revises: 5f0a6d2c8b17
+Create Date: 2026-10-18 03:02:44.170532
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9d41b7e2c6a3'
+down_revision = '5f0a6d2c8b17'
+branch_labels = None
+depends_on = None
+
+
+# 触发器调用的 cjk_tokens() 由 article_search 在每个SQLite连接上注册
+def upgrade():
+    if op.get_bind().dialect.name != 'sqlite':
+        return
+
+    op.execute("""
+        CREATE VIRTUAL TABLE articles_fts USING fts5(
+            title, summary, content, content='', tokenize='unicode61'
+        )
+    """)
+    op.execute("""
+        CREATE TRIGGER articles_fts_ai AFTER INSERT ON articles BEGIN
+            INSERT INTO articles_fts(rowid, title, summary, content)
+            VALUES (new.id, cjk_tokens(new.title), cjk_tokens(new.summary), cjk_tokens(new.content));
+        END
+    """)
+    op.execute("""
+        CREATE TRIGGER articles_fts_ad AFTER DELETE ON articles BEGIN
+            INSERT INTO articles_fts(articles_fts, rowid, title, summary, content)
+            VALUES ('delete', old.id, cjk_tokens(old.title), cjk_tokens(old.summary), cjk_tokens(old.content));
+        END
+    """)
+    op.execute("""
+        CREATE TRIGGER articles_fts_au AFTER UPDATE OF title, summary, content ON articles BEGIN
+            INSERT INTO articles_fts(articles_fts, rowid, title, summary, content)
+            VALUES ('delete', old.id, cjk_tokens(old.title), cjk_tokens(old.summary), cjk_tokens(old.content));
+            INSERT INTO articles_fts(rowid, title, summary, content)
+            VALUES (new.id, cjk_tokens(new.title), cjk_tokens(new.summary), cjk_tokens(new.content));
+        END
+    """)
+    op.execute("""
+        INSERT INTO articles_fts(rowid, title, summary, content)
+        SELECT id, cjk_tokens(title), cjk_tokens(summary), cjk_tokens(content) FROM articles
+    """)
+
+
+def downgrade():
+    if op.get_bind().dialect.name != 'sqlite':
+        return
+
+    op.execute("DROP TRIGGER IF EXISTS articles_fts_au")
+    op.execute("DROP TRIGGER IF EXISTS articles_fts_ad")
+    op.execute("DROP TRIGGER IF EXISTS articles_fts_ai")
+    op.execute("DROP TABLE IF EXISTS articles_fts")
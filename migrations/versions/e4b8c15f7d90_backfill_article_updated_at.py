@@ -0,0 +1,25 @@
+"""backfill article updated_at
+
+Revision ID: e4b8c15f7d90
+Revises: 9d41b7e2c6a3
+Create Date: 2026-10-18 03:40:12.655318
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e4b8c15f7d90'
+down_revision = '9d41b7e2c6a3'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # 游标分页按 (updated_at, id) 排序，旧数据中为空的更新时间用创建时间补齐
+    op.execute("UPDATE articles SET updated_at = COALESCE(created_at, CURRENT_TIMESTAMP) WHERE updated_at IS NULL")
+
+
+def downgrade():
+    pass
@@ -0,0 +1,38 @@
+"""rebuild search index with plain text extraction
+
+Revision ID: f4c2a8d61e37
+Revises: 6d1f8a3c9e52
+Create Date: 2026-10-18 07:41:09.518273
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f4c2a8d61e37'
+down_revision = '6d1f8a3c9e52'
+branch_labels = None
+depends_on = None
+
+
+# cjk_tokens() 改为先提取Markdown/HTML纯文本再切分；contentless索引删除旧行时
+# 必须提供与写入时相同的词序列，分词规则变化后需要按新规则重建索引
+def upgrade():
+    connection = op.get_bind()
+    if connection.dialect.name != 'sqlite':
+        return
+    if connection.execute(sa.text(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'articles_fts'"
+    )).first() is None:
+        return
+
+    op.execute("INSERT INTO articles_fts(articles_fts) VALUES ('delete-all')")
+    op.execute("""
+        INSERT INTO articles_fts(rowid, title, summary, content)
+        SELECT id, cjk_tokens(title), cjk_tokens(summary), cjk_tokens(content) FROM articles
+    """)
+
+
+def downgrade():
+    pass
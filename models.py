@@ -1,10 +1,34 @@
+from flask import current_app, has_app_context
 from flask_sqlalchemy import SQLAlchemy
 from flask_login import UserMixin
 from datetime import datetime
+import json
+import sqlite3
+from sqlalchemy import event, inspect, case
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import defer, joinedload, selectinload
 from werkzeug.security import generate_password_hash, check_password_hash
+from config import DATABASE_CONFIG
+from article_text import extract_text
 
 db = SQLAlchemy()
 
+@event.listens_for(Engine, 'connect')
+def _configure_sqlite_connection(dbapi_connection, connection_record):
+    """SQLite连接参数按连接生效，每个新连接都要设置"""
+    if not isinstance(dbapi_connection, sqlite3.Connection):
+        return
+    cursor = dbapi_connection.cursor()
+    cursor.execute(f"PRAGMA journal_mode={DATABASE_CONFIG['sqlite_journal_mode']}")
+    cursor.execute(f"PRAGMA synchronous={DATABASE_CONFIG['sqlite_synchronous']}")
+    cursor.execute(f"PRAGMA busy_timeout={int(DATABASE_CONFIG['sqlite_busy_timeout'])}")
+    cursor.execute(f"PRAGMA foreign_keys={'ON' if DATABASE_CONFIG['sqlite_foreign_keys'] else 'OFF'}")
+    # 负数表示以KiB为单位
+    cursor.execute(f"PRAGMA cache_size=-{int(DATABASE_CONFIG['sqlite_cache_size'])}")
+    cursor.close()
+
 class User(UserMixin, db.Model):
     __tablename__ = 'users'
     
@@ -31,6 +55,13 @@ class User(UserMixin, db.Model):
 
 class Article(db.Model):
     __tablename__ = 'articles'
+    __table_args__ = (
+        # 文章列表：按用户（和状态）筛选，按更新时间倒序
+        db.Index('ix_articles_user_status_updated', 'user_id', 'status', 'updated_at'),
+        db.Index('ix_articles_user_updated', 'user_id', 'updated_at'),
+        # 导入时按 (用户, 标题) 批量去重
+        db.Index('ix_articles_user_title', 'user_id', 'title'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     title = db.Column(db.String(200), nullable=False)
@@ -52,6 +83,10 @@ class Article(db.Model):
     audit_reasons = db.Column(db.Text, nullable=True)  # JSON格式存储审核原因
     audit_suggestions = db.Column(db.Text, nullable=True)  # JSON格式存储修改建议
     flagged_keywords = db.Column(db.Text, nullable=True)  # JSON格式存储违规关键词
+    audit_status = db.Column(db.String(20), default='done')  # pending, done, failed
+    audit_passed = db.Column(db.Boolean, nullable=True)  # 最近一次审核是否通过
+    content_fingerprint = db.Column(db.String(32), nullable=True)  # 审核时标题+内容的指纹
+    audited_strict_level = db.Column(db.Integer, nullable=True)  # 审核时的严格级别
     
     # WordPress信息
     wp_post_id = db.Column(db.Integer, nullable=True)
@@ -65,18 +100,17 @@ class Article(db.Model):
     # 外键
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
     
-    # 标签关联
-    tags = db.relationship('Tag', secondary='article_tags', backref='articles', lazy='subquery')
+    # 标签关联（列表页通过 list_options() 批量加载）
+    tags = db.relationship('Tag', secondary='article_tags', backref='articles')
     
     def __repr__(self):
         return f'<Article {self.title}>'
     
-    def to_dict(self):
-        """转换为字典格式"""
-        return {
+    def to_dict(self, include_content=True):
+        """转换为字典格式（列表接口不返回正文）"""
+        data = {
             'id': self.id,
             'title': self.title,
-            'content': self.content,
             'summary': self.summary,
             'created_at': self.created_at.strftime('%Y-%m-%d %H:%M:%S') if self.created_at else None,
             'updated_at': self.updated_at.strftime('%Y-%m-%d %H:%M:%S') if self.updated_at else None,
@@ -85,6 +119,7 @@ class Article(db.Model):
             'is_published': self.is_published,
             'audit_score': self.audit_score,
             'risk_level': self.risk_level,
+            'audit_status': self.audit_status,
             'wp_post_id': self.wp_post_id,
             'wp_url': self.wp_url,
             'view_count': self.view_count,
@@ -92,27 +127,258 @@ class Article(db.Model):
             'author': self.author.username if self.author else None,
             'tags': [tag.name for tag in self.tags]
         }
+        if include_content:
+            data['content'] = self.content
+        return data
+    
+    def set_tags(self, tags):
+        """按差异更新标签：只删除去掉的、只添加新增的关联"""
+        wanted = set(tags)
+        for tag in [tag for tag in self.tags if tag not in wanted]:
+            self.tags.remove(tag)
+        current = set(self.tags)
+        self.tags.extend(tag for tag in tags if tag not in current)
+    
+    @classmethod
+    def list_options(cls, include_content=False):
+        """列表页的加载策略：不加载正文，标签用一条IN查询批量加载，作者随文章一起JOIN"""
+        options = [selectinload(cls.tags), joinedload(cls.author)]
+        if not include_content:
+            options.append(defer(cls.content))
+        return options
     
-    def update_word_count(self):
-        """更新字数统计"""
-        import re
-        # 移除HTML标签和Markdown语法，计算纯文本字数
-        clean_text = re.sub(r'<[^>]+>', '', self.content)
-        clean_text = re.sub(r'[#*`\[\]()_~]', '', clean_text)
-        self.word_count = len(clean_text.replace(' ', '').replace('\n', ''))
-    
-    def generate_summary(self, length=200):
-        """生成文章摘要"""
-        import re
-        # 移除HTML标签和Markdown语法
-        clean_text = re.sub(r'<[^>]+>', '', self.content)
-        clean_text = re.sub(r'[#*`\[\]()_~]', '', clean_text)
-        clean_text = clean_text.strip()
+    @classmethod
+    def stats_for_user(cls, user_id):
+        """用户文章统计
         
-        if len(clean_text) <= length:
-            self.summary = clean_text
-        else:
-            self.summary = clean_text[:length] + '...'
+        启用 ARTICLE_STATS_TABLE 时直接读取 user_article_stats 中维护的计数；
+        否则用一条按状态分组的聚合查询计算。
+        """
+        if _stats_table_enabled():
+            row = db.session.get(UserArticleStats, user_id)
+            if row is not None:
+                return row.to_dict()
+        
+        rows = db.session.query(
+            cls.status,
+            db.func.count(cls.id),
+            db.func.sum(cls.word_count),
+            db.func.sum(cls.view_count)
+        ).filter(cls.user_id == user_id).group_by(cls.status).all()
+        
+        stats = {'total': 0, 'published': 0, 'draft': 0, 'archived': 0, 'total_words': 0, 'total_views': 0}
+        for status, count, words, views in rows:
+            stats['total'] += count
+            if status in ARTICLE_STATUSES:
+                stats[status] = count
+            stats['total_words'] += words or 0
+            stats['total_views'] += views or 0
+        return stats
+    
+    def apply_audit_result(self, audit_result, fingerprint=None, strict_level=None):
+        """写入审核结果
+        
+        fingerprint为空时（如降级审核的结果）不记录指纹，下次保存会重新审核。
+        """
+        self.audit_passed = audit_result['passed']
+        self.content_fingerprint = fingerprint
+        self.audited_strict_level = strict_level if fingerprint else None
+        self.audit_score = audit_result['score']
+        self.risk_level = audit_result['risk_level']
+        self.audit_reasons = json.dumps(audit_result['reasons'], ensure_ascii=False)
+        self.audit_suggestions = json.dumps(audit_result['suggestions'], ensure_ascii=False)
+        self.flagged_keywords = json.dumps(audit_result['flagged_keywords'], ensure_ascii=False)
+        self.audit_status = 'done'
+    
+    def stored_audit_result(self, fingerprint, strict_level):
+        """指纹和严格级别都未变化时返回已保存的审核结果，否则返回None"""
+        if (self.audit_status != 'done' or self.audit_passed is None
+                or not fingerprint or self.content_fingerprint != fingerprint
+                or self.audited_strict_level != strict_level):
+            return None
+        return {
+            'passed': self.audit_passed,
+            'score': self.audit_score,
+            'risk_level': self.risk_level,
+            'reasons': json.loads(self.audit_reasons) if self.audit_reasons else [],
+            'suggestions': json.loads(self.audit_suggestions) if self.audit_suggestions else [],
+            'flagged_keywords': json.loads(self.flagged_keywords) if self.flagged_keywords else []
+        }
+    
+    def audit_info(self):
+        """当前审核状态和结果"""
+        return {
+            'article_id': self.id,
+            'audit_status': self.audit_status,
+            'passed': self.audit_passed,
+            'score': self.audit_score,
+            'risk_level': self.risk_level,
+            'reasons': json.loads(self.audit_reasons) if self.audit_reasons else [],
+            'suggestions': json.loads(self.audit_suggestions) if self.audit_suggestions else [],
+            'sensitive_words': json.loads(self.flagged_keywords) if self.flagged_keywords else []
+        }
+    
+    def update_word_count(self, extracted=None):
+        """更新字数统计（不含HTML/Markdown标记和空白），extracted 为已提取的正文"""
+        self.word_count = (extracted or extract_text(self.content)).word_count
+    
+    def generate_summary(self, length=200, extracted=None):
+        """生成文章摘要，extracted 为已提取的正文"""
+        self.summary = (extracted or extract_text(self.content)).summary(length)
+
+@event.listens_for(Article, 'before_insert')
+@event.listens_for(Article, 'before_update')
+def _ensure_summary(mapper, connection, target):
+    """正文变化而摘要为空时补齐摘要，列表页只读summary不加载正文"""
+    if target.summary:
+        return
+    if inspect(target).attrs.content.history.has_changes():
+        target.generate_summary()
+
+# 单独计数的文章状态
+ARTICLE_STATUSES = ('published', 'draft', 'archived')
+
+class UserArticleStats(db.Model):
+    """用户文章统计（由Article的插入/更新/删除事件维护）"""
+    __tablename__ = 'user_article_stats'
+    
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), primary_key=True)
+    total = db.Column(db.Integer, nullable=False, default=0)
+    published = db.Column(db.Integer, nullable=False, default=0)
+    draft = db.Column(db.Integer, nullable=False, default=0)
+    archived = db.Column(db.Integer, nullable=False, default=0)
+    total_words = db.Column(db.Integer, nullable=False, default=0)
+    total_views = db.Column(db.Integer, nullable=False, default=0)
+    
+    def to_dict(self):
+        return {
+            'total': self.total,
+            'published': self.published,
+            'draft': self.draft,
+            'archived': self.archived,
+            'total_words': self.total_words,
+            'total_views': self.total_views
+        }
+    
+    @staticmethod
+    def enabled():
+        """是否启用了统计表（ARTICLE_STATS_TABLE）"""
+        return _stats_table_enabled()
+    
+    @staticmethod
+    def apply_delta(user_id, delta):
+        """累加一个用户的统计（delta 为列名到增量的字典）
+
+        集合式 UPDATE/DELETE 不触发ORM事件，由调用方按受影响文章的分组计算增量后调用。
+        """
+        _apply_stats_delta(db.session.connection(), user_id, delta)
+    
+    @staticmethod
+    def rebuild(user_ids=None):
+        """按articles表重新计算统计（启用统计表或批量修改文章后调用）"""
+        table = UserArticleStats.__table__
+        articles = Article.__table__
+        
+        delete = table.delete()
+        if user_ids is not None:
+            delete = delete.where(table.c.user_id.in_(list(user_ids)))
+        db.session.execute(delete)
+        
+        columns = [
+            articles.c.user_id,
+            db.func.count(articles.c.id),
+        ] + [
+            db.func.sum(case((articles.c.status == status, 1), else_=0))
+            for status in ARTICLE_STATUSES
+        ] + [
+            db.func.coalesce(db.func.sum(articles.c.word_count), 0),
+            db.func.coalesce(db.func.sum(articles.c.view_count), 0),
+        ]
+        select = db.select(*columns).group_by(articles.c.user_id)
+        if user_ids is not None:
+            select = select.where(articles.c.user_id.in_(list(user_ids)))
+        db.session.execute(table.insert().from_select(
+            ['user_id', 'total'] + list(ARTICLE_STATUSES) + ['total_words', 'total_views'],
+            select
+        ))
+
+def _stats_table_enabled():
+    return has_app_context() and current_app.config.get('ARTICLE_STATS_TABLE', False)
+
+def _article_stats_delta(status, word_count, view_count, sign):
+    delta = {
+        'total': sign,
+        'total_words': sign * (word_count or 0),
+        'total_views': sign * (view_count or 0)
+    }
+    for name in ARTICLE_STATUSES:
+        delta[name] = sign if status == name else 0
+    return delta
+
+def _apply_stats_delta(connection, user_id, delta):
+    """在当前flush所用的连接上累加统计（不存在则插入）
+
+    先插入全零的统计行（已存在时跳过）再累加：两个会话同时插入用户的第一批文章时，
+    不会都因为UPDATE没有命中而各自INSERT，其中一个在主键上冲突。
+    """
+    if user_id is None or not any(delta.values()):
+        return
+    table = UserArticleStats.__table__
+    update = table.update() \
+        .where(table.c.user_id == user_id) \
+        .values({name: table.c[name] + value for name, value in delta.items()})
+    if connection.dialect.name in _INSERT_IGNORE_DIALECTS:
+        connection.execute(_insert_ignore(table, ['user_id'], connection).values(user_id=user_id))
+        connection.execute(update)
+    elif connection.execute(update).rowcount == 0:
+        connection.execute(table.insert().values(user_id=user_id, **delta))
+
+def _old_value(state, name):
+    """flush期间取属性修改前的值"""
+    history = state.attrs[name].history
+    if history.deleted:
+        return history.deleted[0]
+    return getattr(state.object, name)
+
+_STATS_FIELDS = ('user_id', 'status', 'word_count', 'view_count')
+
+def _keep_old_value(target, value, oldvalue, initiator):
+    return value
+
+# 提交后属性会过期，赋新值时需要先加载旧值，更新事件中才能扣减旧的统计
+for _name in _STATS_FIELDS:
+    event.listen(getattr(Article, _name), 'set', _keep_old_value, active_history=True, retval=True)
+
+@event.listens_for(Article, 'after_insert')
+def _article_inserted(mapper, connection, target):
+    if _stats_table_enabled():
+        _apply_stats_delta(connection, target.user_id,
+                           _article_stats_delta(target.status, target.word_count, target.view_count, 1))
+
+@event.listens_for(Article, 'after_update')
+def _article_updated(mapper, connection, target):
+    if not _stats_table_enabled():
+        return
+    state = inspect(target)
+    if not any(state.attrs[name].history.has_changes() for name in _STATS_FIELDS):
+        return
+    old = {name: _old_value(state, name) for name in _STATS_FIELDS}
+    removed = _article_stats_delta(old['status'], old['word_count'], old['view_count'], -1)
+    added = _article_stats_delta(target.status, target.word_count, target.view_count, 1)
+    if old['user_id'] == target.user_id:
+        _apply_stats_delta(connection, target.user_id, {name: removed[name] + added[name] for name in added})
+    else:
+        _apply_stats_delta(connection, old['user_id'], removed)
+        _apply_stats_delta(connection, target.user_id, added)
+
+@event.listens_for(Article, 'after_delete')
+def _article_deleted(mapper, connection, target):
+    if not _stats_table_enabled():
+        return
+    state = inspect(target)
+    old = {name: _old_value(state, name) for name in _STATS_FIELDS}
+    _apply_stats_delta(connection, old['user_id'],
+                       _article_stats_delta(old['status'], old['word_count'], old['view_count'], -1))
 
 class Tag(db.Model):
     __tablename__ = 'tags'
@@ -124,18 +390,49 @@ class Tag(db.Model):
     
     def __repr__(self):
         return f'<Tag {self.name}>'
+    
+    @classmethod
+    def resolve(cls, names):
+        """按名称批量取得标签，不存在的一次性插入（已被并发请求创建的忽略），按传入顺序返回"""
+        names = list(dict.fromkeys(name.strip() for name in names if name and name.strip()))
+        if not names:
+            return []
+        
+        found = {tag.name: tag for tag in cls.query.filter(cls.name.in_(names))}
+        missing = [name for name in names if name not in found]
+        if missing:
+            db.session.execute(_insert_ignore(cls.__table__, ['name']), [{'name': name} for name in missing])
+            found.update((tag.name, tag) for tag in cls.query.filter(cls.name.in_(missing)))
+        return [found[name] for name in names]
+
+_INSERT_IGNORE_DIALECTS = ('sqlite', 'postgresql', 'mysql', 'mariadb')
+
+def _insert_ignore(table, conflict_columns, bind=None):
+    """遇到唯一约束冲突时跳过的INSERT（SQLite/PostgreSQL用ON CONFLICT DO NOTHING）
+
+    bind 为执行语句的连接，默认取当前会话的连接；其他数据库返回普通INSERT。
+    """
+    dialect = (bind or db.session.get_bind()).dialect.name
+    if dialect == 'sqlite':
+        return sqlite_insert(table).on_conflict_do_nothing(index_elements=conflict_columns)
+    if dialect == 'postgresql':
+        return postgresql_insert(table).on_conflict_do_nothing(index_elements=conflict_columns)
+    if dialect in ('mysql', 'mariadb'):
+        return table.insert().prefix_with('IGNORE')
+    return table.insert()
 
 # 文章标签关联表
 article_tags = db.Table('article_tags',
     db.Column('article_id', db.Integer, db.ForeignKey('articles.id'), primary_key=True),
-    db.Column('tag_id', db.Integer, db.ForeignKey('tags.id'), primary_key=True)
+    db.Column('tag_id', db.Integer, db.ForeignKey('tags.id'), primary_key=True),
+    db.Index('ix_article_tags_tag_id', 'tag_id')
 )
 
 class AuditLog(db.Model):
     __tablename__ = 'audit_logs'
     
     id = db.Column(db.Integer, primary_key=True)
-    article_id = db.Column(db.Integer, db.ForeignKey('articles.id', ondelete='CASCADE'), nullable=False)
+    article_id = db.Column(db.Integer, db.ForeignKey('articles.id', ondelete='CASCADE'), nullable=False, index=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
     
     # 审核结果
@@ -158,12 +455,28 @@ class AuditLog(db.Model):
     
     def __repr__(self):
         return f'<AuditLog {self.id}>'
+    
+    @classmethod
+    def from_audit_result(cls, article, user_id, audit_result, strict_level, audit_type='auto'):
+        """根据审核结果创建审核日志"""
+        return cls(
+            article_id=article.id,
+            user_id=user_id,
+            passed=audit_result['passed'],
+            score=audit_result['score'],
+            risk_level=audit_result['risk_level'],
+            reasons=json.dumps(audit_result['reasons'], ensure_ascii=False),
+            suggestions=json.dumps(audit_result['suggestions'], ensure_ascii=False),
+            flagged_keywords=json.dumps(audit_result['flagged_keywords'], ensure_ascii=False),
+            strict_level=strict_level,
+            audit_type=audit_type
+        )
 
 class PublishLog(db.Model):
     __tablename__ = 'publish_logs'
     
     id = db.Column(db.Integer, primary_key=True)
-    article_id = db.Column(db.Integer, db.ForeignKey('articles.id', ondelete='CASCADE'), nullable=False)
+    article_id = db.Column(db.Integer, db.ForeignKey('articles.id', ondelete='CASCADE'), nullable=False, index=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
     
     # 发布信息
@@ -182,4 +495,74 @@ class PublishLog(db.Model):
     user = db.relationship('User', backref='publish_logs')
     
     def __repr__(self):
-        return f'<PublishLog {self.id}>'
\ No newline at end of file
+        return f'<PublishLog {self.id}>'
+
+
+class ArticleRevision(db.Model):
+    """文章修订：每隔若干修订保存完整快照，其余只保存相对上一修订的差异（读写见 article_revisions）"""
+    __tablename__ = 'article_revisions'
+    __table_args__ = (
+        db.UniqueConstraint('article_id', 'revision', name='uq_article_revisions_article_revision'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    article_id = db.Column(db.Integer, db.ForeignKey('articles.id', ondelete='CASCADE'), nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=True)
+    revision = db.Column(db.Integer, nullable=False)  # 文章内从1开始递增
+    title = db.Column(db.String(200), nullable=False)
+    kind = db.Column(db.String(10), nullable=False)  # snapshot, delta
+    encoding = db.Column(db.String(10), nullable=False, default='raw')  # raw, zlib, zstd
+    data = db.Column(db.LargeBinary, nullable=False)
+    content_length = db.Column(db.Integer, nullable=False, default=0)  # 还原后正文的字符数
+    content_hash = db.Column(db.String(32))  # 还原后正文的BLAKE2b摘要，判断正文是否变化时不用还原（旧修订为空）
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    def to_dict(self):
+        return {
+            'revision': self.revision,
+            'title': self.title,
+            'kind': self.kind,
+            'content_length': self.content_length,
+            'created_at': self.created_at.strftime('%Y-%m-%d %H:%M:%S') if self.created_at else None
+        }
+
+
+class LogDailyRollup(db.Model):
+    """审核/发布日志的按天、按用户汇总（原始日志过了保留期后只保留汇总）"""
+    __tablename__ = 'log_daily_rollups'
+    
+    log_type = db.Column(db.String(20), primary_key=True)  # audit, publish
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), primary_key=True)
+    day = db.Column(db.Date, primary_key=True)
+    
+    total = db.Column(db.Integer, nullable=False, default=0)
+    succeeded = db.Column(db.Integer, nullable=False, default=0)  # 审核通过 / 发布成功
+    failed = db.Column(db.Integer, nullable=False, default=0)
+    high_risk = db.Column(db.Integer, nullable=False, default=0)
+    medium_risk = db.Column(db.Integer, nullable=False, default=0)
+    low_risk = db.Column(db.Integer, nullable=False, default=0)
+    score_sum = db.Column(db.Float, nullable=False, default=0.0)
+    
+    def to_dict(self):
+        return {
+            'log_type': self.log_type,
+            'day': self.day.isoformat(),
+            'total': self.total,
+            'succeeded': self.succeeded,
+            'failed': self.failed,
+            'high_risk': self.high_risk,
+            'medium_risk': self.medium_risk,
+            'low_risk': self.low_risk,
+            'avg_score': round(self.score_sum / self.total, 4) if self.total else 0.0
+        }
+    
+    @staticmethod
+    def merge(connection, log_type, user_id, day, counts):
+        """把一批日志的计数累加到汇总行（不存在则插入）"""
+        table = LogDailyRollup.__table__
+        key = (table.c.log_type == log_type) & (table.c.user_id == user_id) & (table.c.day == day)
+        updated = connection.execute(
+            table.update().where(key).values({name: table.c[name] + value for name, value in counts.items()})
+        )
+        if updated.rowcount == 0:
+            connection.execute(table.insert().values(log_type=log_type, user_id=user_id, day=day, **counts))
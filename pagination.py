@@ -0,0 +1,127 @@
+"""
+游标分页
+文章列表按 (updated_at, id) 倒序做keyset分页，翻到第N页与第一页开销相同，也不需要COUNT查询。
+搜索结果按 (相关度, updated_at, id) 做keyset分页。游标记录一页的首条或末条记录，可向后或向前翻页。
+要求 updated_at 非空（旧数据由迁移回填）
+"""
+
+import base64
+import json
+from datetime import datetime
+
+from sqlalchemy import and_, or_, tuple_
+
+
+class InvalidCursor(ValueError):
+    """分页游标无法解析"""
+
+
+class KeysetPage:
+    """一页结果及上一页、下一页的游标"""
+
+    def __init__(self, items, next_cursor=None, prev_cursor=None):
+        self.items = items
+        self.next_cursor = next_cursor
+        self.prev_cursor = prev_cursor
+
+    @property
+    def has_next(self) -> bool:
+        return self.next_cursor is not None
+
+    @property
+    def has_prev(self) -> bool:
+        return self.prev_cursor is not None
+
+
+def encode_cursor(data: dict) -> str:
+    raw = json.dumps(data, separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor: str) -> dict:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        data = json.loads(raw)
+    except (ValueError, TypeError) as e:
+        raise InvalidCursor(cursor) from e
+    if not isinstance(data, dict):
+        raise InvalidCursor(cursor)
+    return data
+
+
+def _parse_key(data: dict, ranked: bool):
+    """游标中的排序键：(相关度, updated_at, id)，不按相关度排序时相关度为None"""
+    try:
+        rank = float(data['r']) if ranked else None
+        return rank, datetime.fromisoformat(data['u']), int(data['i'])
+    except (KeyError, TypeError, ValueError) as e:
+        raise InvalidCursor(data) from e
+
+
+def _beyond(model, rank, key, backward: bool):
+    """排在游标所指记录之后（backward时为之前）的条件
+
+    (updated_at, id) 用行值比较，可直接在 (user_id, ..., updated_at) 索引上定位；
+    相关度升序而时间倒序，方向不同，按相关度分开比较。
+    """
+    rank_value, updated_at, last_id = key
+    row, value = tuple_(model.updated_at, model.id), tuple_(updated_at, last_id)
+    condition = row > value if backward else row < value
+    if rank is None:
+        return condition
+    return or_(rank < rank_value if backward else rank > rank_value, and_(rank == rank_value, condition))
+
+
+def _cursor(article, rank_value, backward: bool = False) -> str:
+    data = {'u': article.updated_at.isoformat(), 'i': article.id}
+    if rank_value is not None:
+        data['r'] = rank_value
+    if backward:
+        data['d'] = 'prev'
+    return encode_cursor(data)
+
+
+def keyset_paginate(query, model, cursor: str = None, per_page: int = 12, rank=None) -> KeysetPage:
+    """按 (updated_at, id) 倒序取一页
+
+    rank 为搜索相关度表达式（如FTS5的bm25，越小越相关），给出时按 (相关度, updated_at, id) 排序，
+    相关度也记录在游标中，深页同样只需定位游标之后的记录，不使用OFFSET。
+    全文搜索仍要为全部命中结果计算相关度，这部分开销与页码无关。
+    游标带 d=prev 时取游标之前的一页（上一页）。
+    """
+    data = decode_cursor(cursor) if cursor else {}
+    backward = data.get('d') == 'prev'
+
+    if rank is not None:
+        query = query.order_by(None).add_columns(rank)
+    if data:
+        query = query.filter(_beyond(model, rank, _parse_key(data, rank is not None), backward))
+    if backward:
+        order = [model.updated_at.asc(), model.id.asc()]
+        if rank is not None:
+            order.insert(0, rank.desc())
+    else:
+        order = [model.updated_at.desc(), model.id.desc()]
+        if rank is not None:
+            order.insert(0, rank.asc())
+    rows = query.order_by(*order).limit(per_page + 1).all()
+
+    has_more = len(rows) > per_page
+    rows = rows[:per_page]
+    if backward:
+        rows.reverse()
+    if rank is not None:
+        items, ranks = [row[0] for row in rows], [row[1] for row in rows]
+    else:
+        items, ranks = rows, [None] * len(rows)
+    if not items:
+        return KeysetPage([])
+
+    # 向后翻页时游标之前一定有记录，向前翻页时游标之后一定有记录
+    more_after = has_more if not backward else True
+    more_before = has_more if backward else bool(data)
+    return KeysetPage(
+        items,
+        next_cursor=_cursor(items[-1], ranks[-1]) if more_after else None,
+        prev_cursor=_cursor(items[0], ranks[0], backward=True) if more_before else None
+    )
@@ -0,0 +1,340 @@
+"""
+WordPress发布
+按 (站点URL, 用户名) 复用 XML-RPC 客户端，同一站点的客户端共用一个保持长连接的连接池：
+连续发布不再重复建立TCP/TLS连接和客户端（创建客户端还要多一次 mt.supportedMethods 调用），
+空闲连接和客户端超时后关闭，每个站点的并发请求数有上限
+"""
+
+import hmac
+import http.client
+import threading
+import time
+import traceback
+from urllib.parse import urlsplit
+
+from wordpress_xmlrpc import Client, WordPressPost
+from wordpress_xmlrpc.compat import xmlrpc_client
+from wordpress_xmlrpc.methods.posts import NewPost
+from wordpress_xmlrpc.methods.taxonomies import GetTerms
+
+from config import WORDPRESS_POOL_CONFIG
+
+
+class PoolTimeoutError(RuntimeError):
+    """等待站点的空闲连接超时"""
+
+
+class PooledTransport(xmlrpc_client.Transport):
+    """保持长连接的 XML-RPC 传输（线程安全）
+
+    标准库的 Transport 只缓存一个连接且不能并发使用。这里为一个站点维护空闲连接池：
+    请求时取出一个空闲连接（没有则新建），响应读完且服务器没有要求关闭时放回，
+    空闲超过 idle_timeout 的连接在取用和清理时关闭；max_connections 同时限制并发请求数和连接数。
+    """
+
+    def __init__(self, https=False, max_connections=4, idle_timeout=15.0,
+                 acquire_timeout=60.0, timeout=30.0, context=None):
+        super().__init__()
+        self.https = https
+        self.max_connections = max_connections
+        self.idle_timeout = idle_timeout
+        self.acquire_timeout = acquire_timeout
+        self.timeout = timeout
+        self.context = context
+        # [(连接, 放回时间)]，后放回的在末尾
+        self._idle = []
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(max_connections)
+        self._local = threading.local()
+
+        self.connections_created = 0
+        self.connections_reused = 0
+
+    def _checkout(self, host):
+        """取一个未超时的空闲连接，没有则新建；返回 (连接, 是否复用)"""
+        expired = []
+        connection = None
+        now = time.monotonic()
+        with self._lock:
+            while self._idle:
+                candidate, released_at = self._idle.pop()
+                if now - released_at <= self.idle_timeout:
+                    connection = candidate
+                    break
+                expired.append(candidate)
+            if connection is not None:
+                self.connections_reused += 1
+            else:
+                self.connections_created += 1
+        for stale in expired:
+            stale.close()
+        if connection is not None:
+            return connection, True
+
+        chost, self._extra_headers, x509 = self.get_host_info(host)
+        if self.https:
+            connection = http.client.HTTPSConnection(chost, timeout=self.timeout, context=self.context, **(x509 or {}))
+        else:
+            connection = http.client.HTTPConnection(chost, timeout=self.timeout)
+        return connection, False
+
+    def _release(self, connection):
+        with self._lock:
+            self._idle.append((connection, time.monotonic()))
+
+    def make_connection(self, host):
+        # send_request 通过它取得本次请求使用的连接
+        return self._local.connection
+
+    def single_request(self, host, handler, request_body, verbose=False):
+        if not self._slots.acquire(timeout=self.acquire_timeout):
+            raise PoolTimeoutError(f"等待 {host} 的空闲连接超时（上限 {self.max_connections} 个）")
+        try:
+            connection, reused = self._checkout(host)
+            self._local.connection = connection
+            keep = False
+            try:
+                self.send_request(host, handler, request_body, verbose)
+                response = connection.getresponse()
+                if response.status != 200:
+                    if response.getheader("content-length", ""):
+                        response.read()
+                    keep = not response.will_close
+                    raise xmlrpc_client.ProtocolError(host + handler, response.status, response.reason,
+                                                      dict(response.getheaders()))
+                self.verbose = verbose
+                try:
+                    result = self.parse_response(response)
+                except xmlrpc_client.Fault:
+                    # Fault 是完整读取的正常响应，连接仍可复用
+                    keep = not response.will_close
+                    raise
+                keep = not response.will_close
+                return result
+            except (http.client.RemoteDisconnected, ConnectionError):
+                # 复用的连接已被服务器关闭，同时空闲的连接多半也已失效，
+                # 全部丢弃，request() 重试时会新建连接
+                if reused:
+                    self.close()
+                raise
+            finally:
+                self._local.connection = None
+                if keep:
+                    self._release(connection)
+                else:
+                    connection.close()
+        finally:
+            self._slots.release()
+
+    def evict_idle(self):
+        """关闭空闲超时的连接，返回关闭的个数"""
+        now = time.monotonic()
+        with self._lock:
+            expired = [connection for connection, released_at in self._idle if now - released_at > self.idle_timeout]
+            self._idle = [(connection, released_at) for connection, released_at in self._idle
+                          if now - released_at <= self.idle_timeout]
+        for connection in expired:
+            connection.close()
+        return len(expired)
+
+    def idle_count(self):
+        with self._lock:
+            return len(self._idle)
+
+    def close(self):
+        """关闭所有空闲连接（进行中的请求完成后各自关闭或放回）"""
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for connection, _ in idle:
+            connection.close()
+
+
+class WordPressPublisher:
+    def __init__(self, wp_url, username, password, transport=None):
+        self.wp_url = wp_url
+        self.username = username
+        self.password = password
+        self.transport = transport
+        self.client = None
+        self._categories_cache = {}
+        self._connect_lock = threading.Lock()
+
+    def connect(self):
+        """连接到WordPress"""
+        with self._connect_lock:
+            if self.client:
+                return True
+            try:
+                self.client = Client(f"{self.wp_url}/xmlrpc.php", self.username, self.password,
+                                     transport=self.transport)
+                return True
+            except Exception as e:
+                print(f"WordPress连接失败: {e}")
+                return False
+
+    def get_categories(self):
+        """获取WordPress分类列表"""
+        if not self.client and not self.connect():
+            return {}
+
+        try:
+            # 获取所有分类
+            categories = self.client.call(GetTerms('category'))
+            category_dict = {}
+
+            for category in categories:
+                category_dict[category.id] = {
+                    'name': category.name,
+                    'slug': category.slug,
+                    'description': getattr(category, 'description', ''),
+                    'count': getattr(category, 'count', 0)
+                }
+
+            self._categories_cache = category_dict
+            return category_dict
+
+        except Exception as e:
+            print(f"获取分类失败: {e}")
+            return {}
+
+    def get_category_name(self, category_id):
+        """根据ID获取分类名称（客户端会被复用，缓存中没有时重新获取一次，以便找到新建的分类）"""
+        category_info = self._categories_cache.get(int(category_id))
+        if category_info is None:
+            category_info = self.get_categories().get(int(category_id))
+        return category_info['name'] if category_info else None
+
+    def publish_post(self, title, content, category_id=None):
+        """发布文章到WordPress"""
+        if not self.client and not self.connect():
+            return False
+
+        try:
+            post = WordPressPost()
+            post.title = title
+            post.content = content
+            post.post_status = 'publish'
+
+            if category_id:
+                # 方法1: 使用分类ID直接设置
+                post.terms = {
+                    'category': [int(category_id)]
+                }
+
+                # 方法2: 如果方法1不工作，尝试使用分类名称
+                category_name = self.get_category_name(category_id)
+                if category_name:
+                    print(f"设置分类: ID={category_id}, 名称={category_name}")
+                    post.terms_names = {
+                        'category': [category_name]
+                    }
+                else:
+                    print(f"警告: 未找到分类ID {category_id} 对应的名称")
+
+            post_id = self.client.call(NewPost(post))
+            print(f"文章发布成功，WordPress文章ID: {post_id}")
+            return post_id
+
+        except Exception as e:
+            print(f"发布失败: {e}")
+            traceback.print_exc()
+            return False
+
+
+def _site_key(wp_url):
+    """站点键：协议和主机（不区分大小写），URL末尾的斜杠不影响"""
+    parts = urlsplit(wp_url.strip())
+    return f"{parts.scheme.lower()}://{parts.netloc.lower()}{parts.path.rstrip('/')}"
+
+
+class PublisherRegistry:
+    """进程内的发布客户端注册表
+
+    客户端按 (站点, 用户名) 复用，同一站点的客户端共用一个 PooledTransport。
+    密码与已缓存的客户端不一致时（修改了密码或他人尝试使用同一账号）创建新客户端替换，
+    不会用已登录的客户端代替校验密码。客户端空闲超过 publisher_idle_timeout 后移除，
+    站点没有客户端时关闭其连接池。
+    """
+
+    def __init__(self, config=None):
+        self.config = config or WORDPRESS_POOL_CONFIG
+        # (站点, 用户名) -> [发布客户端, 最后使用时间]
+        self._publishers = {}
+        # 站点 -> PooledTransport
+        self._transports = {}
+        self._lock = threading.Lock()
+
+    def _transport(self, site):
+        transport = self._transports.get(site)
+        if transport is None:
+            transport = PooledTransport(
+                https=site.startswith('https://'),
+                max_connections=self.config['max_connections'],
+                idle_timeout=self.config['connection_idle_timeout'],
+                acquire_timeout=self.config['acquire_timeout'],
+                timeout=self.config['request_timeout']
+            )
+            self._transports[site] = transport
+        return transport
+
+    def get(self, wp_url, username, password):
+        """取得站点和用户名对应的发布客户端，没有或密码不一致时新建"""
+        site = _site_key(wp_url)
+        key = (site, username)
+        now = time.monotonic()
+        with self._lock:
+            entry = self._publishers.get(key)
+            if entry is None or not hmac.compare_digest(entry[0].password.encode('utf-8'),
+                                                        password.encode('utf-8')):
+                publisher = WordPressPublisher(wp_url.strip().rstrip('/'), username, password,
+                                               transport=self._transport(site))
+                entry = self._publishers[key] = [publisher, now]
+            entry[1] = now
+            publisher = entry[0]
+        self.evict_idle()
+        return publisher
+
+    def evict_idle(self):
+        """移除空闲超时的客户端，关闭没有客户端的站点连接池和各站点空闲超时的连接"""
+        now = time.monotonic()
+        with self._lock:
+            for key in [key for key, (_, last_used) in self._publishers.items()
+                        if now - last_used > self.config['publisher_idle_timeout']]:
+                del self._publishers[key]
+            active_sites = {site for site, _ in self._publishers}
+            closed = [self._transports.pop(site) for site in list(self._transports) if site not in active_sites]
+            transports = list(self._transports.values())
+        for transport in closed:
+            transport.close()
+        for transport in transports:
+            transport.evict_idle()
+
+    def stats(self):
+        """各站点连接池的使用情况"""
+        with self._lock:
+            return {
+                site: {
+                    'publishers': sum(1 for key in self._publishers if key[0] == site),
+                    'idle_connections': transport.idle_count(),
+                    'connections_created': transport.connections_created,
+                    'connections_reused': transport.connections_reused,
+                }
+                for site, transport in self._transports.items()
+            }
+
+    def close(self):
+        """清空注册表并关闭所有连接"""
+        with self._lock:
+            transports = list(self._transports.values())
+            self._publishers.clear()
+            self._transports.clear()
+        for transport in transports:
+            transport.close()
+
+
+publisher_registry = PublisherRegistry()
+
+
+def get_publisher(wp_url, username, password) -> WordPressPublisher:
+    """从进程内注册表取得发布客户端"""
+    return publisher_registry.get(wp_url, username, password)